@@ -0,0 +1,97 @@
+# Tarif toplu islerinin (benzer tarifler ve kisisel oneriler) sure olcumu.
+#
+# Gecici bir veritabanina sentetik katalog yazar: malzemeler ve kullanici
+# etkilesimleri Zipf dagilimli secilir (birkac populer malzeme/tarif, uzun
+# kuyruk). Sonra rebuild_similar_recipes ve rebuild_recipe_recommendations
+# calistirilip sureleri yazdirilir.
+#
+#   python api/bench/recipe_jobs.py --recipes 20000 --users 20000
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _zipf_choice(rng: random.Random, weights: list, k: int) -> list:
+    return rng.choices(range(len(weights)), cum_weights=weights, k=k)
+
+
+def _cumulative_zipf(size: int) -> list:
+    total = 0.0
+    cumulative = []
+    for rank in range(1, size + 1):
+        total += 1.0 / rank
+        cumulative.append(total)
+    return cumulative
+
+
+def seed(main, recipes: int, users: int, rng: random.Random) -> None:
+    ingredients = _cumulative_zipf(3000)
+    words = _cumulative_zipf(1500)
+    with main.engine.begin() as conn:
+        conn.execute(
+            main.RecipeDB.__table__.insert(),
+            [
+                {
+                    "title": " ".join(
+                        f"kelime{w}" for w in _zipf_choice(rng, words, rng.randint(2, 4))
+                    ),
+                    "category": f"kategori{rng.randrange(20)}",
+                    "ingredients_json": json.dumps(
+                        [
+                            f"malzeme{i}"
+                            for i in _zipf_choice(rng, ingredients, rng.randint(6, 14))
+                        ]
+                    ),
+                    "author_email": "bench@eaty.local",
+                    "likes": 0,
+                    "comments": 0,
+                }
+                for _ in range(recipes)
+            ],
+        )
+        popularity = _cumulative_zipf(recipes)
+        rows = []
+        for user in range(users):
+            liked = set(_zipf_choice(rng, popularity, rng.randint(3, 60)))
+            rows.extend(
+                {"recipe_id": recipe + 1, "user_email": f"u{user}@eaty.local"}
+                for recipe in liked
+            )
+        conn.execute(main.RecipeLikeDB.__table__.insert(), rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tarif toplu isleri sure olcumu")
+    parser.add_argument("--recipes", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["EATY_DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    sys.path.insert(0, API_DIR)
+    import main as app
+
+    seed(app, args.recipes, args.users, random.Random(args.seed))
+    for name, job in (
+        ("rebuild_similar_recipes", app.rebuild_similar_recipes),
+        ("rebuild_recipe_recommendations", app.rebuild_recipe_recommendations),
+    ):
+        db = app.SessionLocal()
+        try:
+            started = time.perf_counter()
+            count = job(db)
+            elapsed = time.perf_counter() - started
+        finally:
+            db.close()
+        print(f"{name}: {count} rows in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
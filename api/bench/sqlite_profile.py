@@ -0,0 +1,129 @@
+# SQLite PRAGMA profili yuk testi.
+#
+# Gecici bir veritabani dosyasinda N thread ile karisik yuk calistirir: her
+# dort islemden biri siparis + kalem ekler, digerleri musterinin son 50
+# siparisini okur. "legacy" profili eski varsayilanlari (DELETE journal,
+# synchronous=FULL, varsayilan cache, mmap kapali) EATY_SQLITE_* ayarlariyla
+# geri getirir; "tuned" main.py'deki varsayilanlari kullanir.
+#
+#   python api/bench/sqlite_profile.py                 # iki profil ardisik
+#   python api/bench/sqlite_profile.py --profile tuned --threads 16 --ops 400
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = {
+    "legacy": {
+        "EATY_SQLITE_JOURNAL_MODE": "DELETE",
+        "EATY_SQLITE_SYNCHRONOUS": "FULL",
+        "EATY_SQLITE_CACHE_SIZE": "-2000",
+        "EATY_SQLITE_MMAP_SIZE": "0",
+    },
+    "tuned": {},
+}
+
+
+def run(profile: str, threads: int, ops: int) -> None:
+    sys.path.insert(0, API_DIR)
+    import main
+    from sqlalchemy import text
+
+    lock = threading.Lock()
+    stats = {"ok": 0, "errors": 0}
+
+    def worker(index: int) -> None:
+        email = f"bench{index}@eaty.local"
+        for op in range(ops):
+            db = main.SessionLocal()
+            try:
+                if op % 4 == 0:
+                    order = main.OrderDB(
+                        business_id=1,
+                        customer_email=email,
+                        customer_address="bench",
+                        total_price=1,
+                    )
+                    db.add(order)
+                    db.flush()
+                    db.add(
+                        main.OrderItemDB(
+                            order_id=order.id, product_name="p", quantity=1, price=1
+                        )
+                    )
+                    db.commit()
+                else:
+                    (
+                        db.query(main.OrderDB)
+                        .filter(main.OrderDB.customer_email == email)
+                        .order_by(main.OrderDB.created_at.desc(), main.OrderDB.id.desc())
+                        .limit(50)
+                        .all()
+                    )
+                key = "ok"
+            except Exception:
+                key = "errors"
+            finally:
+                db.close()
+            with lock:
+                stats[key] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    with main.engine.connect() as conn:
+        journal_mode = conn.execute(text("PRAGMA journal_mode")).scalar()
+    print(
+        f"[{profile}] journal={journal_mode} threads={threads} ops={stats['ok']} "
+        f"errors={stats['errors']} {stats['ok'] / elapsed:.0f} ops/s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SQLite PRAGMA profili yuk testi")
+    parser.add_argument("--profile", choices=sorted(PROFILES))
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=400)
+    args = parser.parse_args()
+
+    if args.profile and os.environ.get("EATY_BENCH_CHILD"):
+        run(args.profile, args.threads, args.ops)
+        return
+
+    # Her profil ayri bir process ve bos bir veritabaniyla calisir; PRAGMA'lar
+    # main.py import edilirken okundugu icin ayni process'te degistirilemez.
+    for profile in [args.profile] if args.profile else ["legacy", "tuned"]:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {
+                **os.environ,
+                **PROFILES[profile],
+                "EATY_BENCH_CHILD": "1",
+                "EATY_DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+            }
+            subprocess.run(
+                [
+                    sys.executable,
+                    os.path.abspath(__file__),
+                    "--profile",
+                    profile,
+                    "--threads",
+                    str(args.threads),
+                    "--ops",
+                    str(args.ops),
+                ],
+                env=env,
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,309 @@
+import asyncio
+import atexit
+import collections
 import datetime
+import functools
+import inspect
 import os
 import base64
+import codecs
+import csv
 import hashlib
+import heapq
 import hmac
 import json
-from typing import List, Optional
-
-from fastapi import FastAPI, HTTPException, Depends, Body
-from pydantic import BaseModel
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, ForeignKey, DateTime, text, func
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Union
+
+from fastapi import FastAPI, HTTPException, Depends, Body, Header, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import create_engine, event, inspect as sa_inspect, bindparam, case, literal, select, Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Index, text, func, or_, and_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session, relationship
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.orm import sessionmaker, Session, relationship, selectinload, load_only
+
 
+logger = logging.getLogger("eaty")
 
-# --- Database Setup (SQLite) ---
+# --- Database Setup (SQLite varsayilan, EATY_DATABASE_URL ile PostgreSQL) ---
 DB_PATH = os.path.join(os.path.dirname(__file__), "eaty.db")
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+SQLALCHEMY_DATABASE_URL = (
+    os.environ.get("EATY_DATABASE_URL")
+    or os.environ.get("DATABASE_URL")
+    or f"sqlite:///{DB_PATH}"
+)
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+
+DB_POOL_SIZE = int(os.environ.get("EATY_DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("EATY_DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.environ.get("EATY_DB_POOL_TIMEOUT", "30"))
+
+# Her yeni SQLite baglantisinda uygulanir. WAL okuyuculari yazicidan ayirir;
+# NORMAL senkronizasyon WAL ile guvenlidir ve commit basina fsync'i kaldirir.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("EATY_SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("EATY_SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.environ.get("EATY_SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "mmap_size": int(os.environ.get("EATY_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.environ.get("EATY_SQLITE_CACHE_SIZE", "-65536")),  # KiB
+    "temp_store": "MEMORY",
+}
+
+
+def _create_engine():
+    if IS_SQLITE:
+        return create_engine(
+            SQLALCHEMY_DATABASE_URL,
+            connect_args={"check_same_thread": False},
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+    return create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+    )
+
+
+engine = _create_engine()
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# EATY_DB_MODE=async: endpointler async def olur ve DB I/O'sunu event loop
+# uzerinde bekler (SQLAlchemy asyncio + aiosqlite/asyncpg). Varsayilan "sync"
+# mevcut threadpool yolunu kullanir. Migrationlar her iki modda da sync engine
+# ile calisir.
+DB_MODE = os.environ.get("EATY_DB_MODE", "sync").strip().lower()
+if DB_MODE not in ("sync", "async"):
+    raise RuntimeError("EATY_DB_MODE must be 'sync' or 'async'")
+ASYNC_DB = DB_MODE == "async"
+
+
+def _async_database_url(url: str) -> str:
+    override = os.environ.get("EATY_ASYNC_DATABASE_URL")
+    if override:
+        return override
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    for prefix in ("postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_DB:
+    from sqlalchemy.ext.asyncio import (
+        AsyncSession,
+        async_sessionmaker,
+        create_async_engine,
+    )
+
+    async_engine = create_async_engine(
+        _async_database_url(SQLALCHEMY_DATABASE_URL),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=not IS_SQLITE,
+    )
+    if IS_SQLITE:
+        event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    # Yanit, run_sync disinda serialize edildigi icin commit sonrasi
+    # nesneler expire edilmez (aksi halde lazy load greenlet disinda kalir).
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
 Base = declarative_base()
 
 
 # --- Password helpers (PBKDF2) ---
+# Hash formati: pbkdf2_sha256$<iterasyon>$<salt>$<dk>. Iterasyon sayisi
+# hash icinde saklanir; eski 3 parcali hashler 200.000 kabul edilir.
+PBKDF2_ITERATIONS = int(os.environ.get("EATY_PBKDF2_ITERATIONS", "200000"))
+PASSWORD_HASH_WORKERS = int(
+    os.environ.get("EATY_PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get("EATY_PASSWORD_HASH_QUEUE_LIMIT", "16"))
+_LEGACY_PBKDF2_ITERATIONS = 200_000
+
+_password_pool: Optional[ProcessPoolExecutor] = None
+_password_pool_lock = threading.Lock()
+_password_slots = threading.BoundedSemaphore(PASSWORD_HASH_QUEUE_LIMIT)
+
+
+def _get_password_pool() -> ProcessPoolExecutor:
+    global _password_pool
+    with _password_pool_lock:
+        if _password_pool is None:
+            _password_pool = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+        return _password_pool
+
+
+def _pbkdf2(password: str, salt: bytes, iterations: int) -> bytes:
+    # PBKDF2 istek thread'lerinde degil ayri process havuzunda calisir; kuyruk
+    # doluysa beklemek yerine 503 doner ki threadpool kilitlenmesin.
+    if not _password_slots.acquire(blocking=False):
+        raise HTTPException(status_code=503, detail="Server busy, please retry")
+    try:
+        future = _get_password_pool().submit(
+            hashlib.pbkdf2_hmac, "sha256", password.encode("utf-8"), salt, iterations
+        )
+        return future.result()
+    finally:
+        _password_slots.release()
+
+
+def _parse_password_hash(stored: str) -> Optional[tuple[int, bytes, bytes]]:
+    try:
+        parts = stored.split("$")
+        if parts[0] != "pbkdf2_sha256":
+            return None
+        if len(parts) == 3:
+            iterations = _LEGACY_PBKDF2_ITERATIONS
+            salt_b64, dk_b64 = parts[1], parts[2]
+        elif len(parts) == 4:
+            iterations = int(parts[1])
+            salt_b64, dk_b64 = parts[2], parts[3]
+        else:
+            return None
+        salt = base64.b64decode(salt_b64.encode())
+        dk = base64.b64decode(dk_b64.encode())
+        return iterations, salt, dk
+    except Exception:
+        return None
+
+
 def _hash_password(password: str) -> str:
     salt = os.urandom(16)
-    dk = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, 200_000)
-    return f"pbkdf2_sha256${base64.b64encode(salt).decode()}${base64.b64encode(dk).decode()}"
+    dk = _pbkdf2(password, salt, PBKDF2_ITERATIONS)
+    return (
+        f"pbkdf2_sha256${PBKDF2_ITERATIONS}$"
+        f"{base64.b64encode(salt).decode()}${base64.b64encode(dk).decode()}"
+    )
 
 
 def _verify_password(password: str, stored: str) -> bool:
+    parsed = _parse_password_hash(stored)
+    if parsed is None:
+        return False
+    iterations, salt, dk_expected = parsed
+    dk = _pbkdf2(password, salt, iterations)
+    return hmac.compare_digest(dk, dk_expected)
+
+
+def _password_needs_rehash(stored: str) -> bool:
+    parsed = _parse_password_hash(stored)
+    return parsed is None or parsed[0] != PBKDF2_ITERATIONS
+
+
+# --- Session tokens (HMAC-SHA256) ---
+# Token: base64url(json payload) + "." + base64url(imza). Dogrulama tek bir
+# HMAC hesabidir; sifre tekrar hashlenmez. Tum worker'lar ayni EATY_TOKEN_SECRET'i
+# paylasmalidir; yalnizca EATY_ENV=dev iken eksikse process basina rastgele
+# uretilir (yeniden baslatmada ve worker'lar arasinda tokenlar gecersiz olur).
+EATY_ENV = os.environ.get("EATY_ENV", "dev").strip().lower()
+TOKEN_SECRET = os.environ.get("EATY_TOKEN_SECRET", "").encode("utf-8")
+if not TOKEN_SECRET:
+    if EATY_ENV != "dev":
+        raise RuntimeError("EATY_TOKEN_SECRET must be set when EATY_ENV is not 'dev'")
+    logger.warning(
+        "EATY_TOKEN_SECRET is not set; using a per-process secret (dev only)"
+    )
+    TOKEN_SECRET = os.urandom(32)
+ACCESS_TOKEN_TTL_SECONDS = int(os.environ.get("EATY_ACCESS_TOKEN_TTL", "900"))
+REFRESH_TOKEN_TTL_SECONDS = int(os.environ.get("EATY_REFRESH_TOKEN_TTL", str(30 * 24 * 3600)))
+# Eski istemciler token gondermedigi icin varsayilan olarak token opsiyoneldir;
+# gonderilirse her zaman dogrulanir.
+REQUIRE_BUSINESS_TOKEN = os.environ.get("EATY_REQUIRE_BUSINESS_TOKEN", "") == "1"
+
+
+def _b64url_encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _b64url_decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode((value + "=" * (-len(value) % 4)).encode())
+
+
+def _issue_token(
+    business_id: int, email: str, token_type: str, ttl_seconds: int, **extra
+) -> str:
+    payload = {
+        "sub": business_id,
+        "email": email,
+        "typ": token_type,
+        "exp": int(time.time()) + ttl_seconds,
+        **extra,
+    }
+    body = _b64url_encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    signature = hmac.new(TOKEN_SECRET, body.encode(), hashlib.sha256).digest()
+    return f"{body}.{_b64url_encode(signature)}"
+
+
+def _verify_token(token: str, token_type: str) -> Optional[dict]:
     try:
-        algo, salt_b64, dk_b64 = stored.split("$", 2)
-        if algo != "pbkdf2_sha256":
-            return False
-        salt = base64.b64decode(salt_b64.encode())
-        dk_expected = base64.b64decode(dk_b64.encode())
-        dk = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, 200_000)
-        return hmac.compare_digest(dk, dk_expected)
+        body, signature = token.split(".", 1)
+        expected = hmac.new(TOKEN_SECRET, body.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64url_decode(signature)):
+            return None
+        payload = json.loads(_b64url_decode(body))
     except Exception:
-        return False
+        return None
+    if payload.get("typ") != token_type:
+        return None
+    if int(payload.get("exp", 0)) < time.time():
+        return None
+    return payload
+
+
+def _issue_business_tokens(business_id: int, email: str, token_version: int) -> dict:
+    # "ver" sifre sifirlaninca artan token_version'dir; eski refresh tokenlar
+    # yenileme sirasinda reddedilir
+    return {
+        "access_token": _issue_token(
+            business_id, email, "access", ACCESS_TOKEN_TTL_SECONDS
+        ),
+        "refresh_token": _issue_token(
+            business_id,
+            email,
+            "refresh",
+            REFRESH_TOKEN_TTL_SECONDS,
+            ver=token_version,
+        ),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_TTL_SECONDS,
+    }
 
 
 # --- Models (Tablolar) ---
@@ -70,6 +335,7 @@ class BusinessDB(Base):
     open_address = Column(String, nullable=True)
 
     password_hash = Column(String, nullable=True)  # email/şifre login için
+    token_version = Column(Integer, default=0)
 
     is_open = Column(Boolean, default=True)
 
@@ -123,8 +389,14 @@ class ProductDB(Base):
     image_url = Column(String, nullable=True)
     is_available = Column(Boolean, default=True)
     sequence = Column(Integer, default=0)
+    external_sku = Column(String, nullable=True)  # toplu ice aktarma anahtari
+    search_text = Column(String, nullable=True)  # FTS5 yoksa LIKE yedeginin katlanmis metni
     business = relationship("BusinessDB", back_populates="products")
 
+    __table_args__ = (
+        Index("ux_products_business_id_external_sku", "business_id", "external_sku", unique=True),
+    )
+
 
 class OrderDB(Base):
     __tablename__ = "orders"
@@ -142,17 +414,32 @@ class OrderDB(Base):
     items = relationship("OrderItemDB", back_populates="order")
     business = relationship("BusinessDB", back_populates="orders")
 
+    __table_args__ = (
+        Index("ix_orders_customer_email_created_at", customer_email, created_at),
+        Index("ix_orders_business_status_created_at", business_id, status, created_at),
+    )
+
 
 class OrderItemDB(Base):
     __tablename__ = "order_items"
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
     product_name = Column(String)
     quantity = Column(Integer)
     price = Column(Float)
     order = relationship("OrderDB", back_populates="items")
 
 
+class OrderIdempotencyKeyDB(Base):
+    # Ayni Idempotency-Key ile tekrarlanan siparis istegi ayni siparisi dondurur
+    __tablename__ = "order_idempotency_keys"
+    customer_email = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    request_hash = Column(String)
+    order_id = Column(Integer, ForeignKey("orders.id"))
+    expires_at = Column(DateTime, index=True)
+
+
 class BusinessReviewDB(Base):
     __tablename__ = "business_reviews"
     id = Column(Integer, primary_key=True, index=True)
@@ -170,6 +457,58 @@ class BusinessReviewDB(Base):
     order = relationship("OrderDB")
 
 
+class BusinessGeoCellDB(Base):
+    # Teslimat alaninin kapsadigi her grid hucresi icin bir satir
+    __tablename__ = "business_geo_cells"
+    cell_key = Column(String, primary_key=True)
+    business_id = Column(
+        Integer, ForeignKey("businesses.id"), primary_key=True, index=True
+    )
+
+
+class BusinessRatingStatsDB(Base):
+    __tablename__ = "business_rating_stats"
+    business_id = Column(Integer, ForeignKey("businesses.id"), primary_key=True)
+    review_count = Column(Integer, default=0)
+    rating_sum = Column(Float, default=0)  # yorum basina (hiz + servis + lezzet) / 3
+    speed_sum = Column(Integer, default=0)
+    service_sum = Column(Integer, default=0)
+    taste_sum = Column(Integer, default=0)
+
+
+class BusinessStatsHourlyDB(Base):
+    # Saatlik siparis/yorum ozetleri; bucket Turkiye saatiyle saat basi
+    __tablename__ = "business_stats_hourly"
+    business_id = Column(Integer, ForeignKey("businesses.id"), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    order_count = Column(Integer, default=0)
+    revenue = Column(Float, default=0)  # iptal edilen siparisler dusulur
+    cancelled_count = Column(Integer, default=0)
+    review_count = Column(Integer, default=0)
+    rating_sum = Column(Float, default=0)
+
+
+class BusinessStatsDailyDB(Base):
+    # Gunluk ozetler; bucket Turkiye saatiyle gece yarisi
+    __tablename__ = "business_stats_daily"
+    business_id = Column(Integer, ForeignKey("businesses.id"), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    order_count = Column(Integer, default=0)
+    revenue = Column(Float, default=0)
+    cancelled_count = Column(Integer, default=0)
+    review_count = Column(Integer, default=0)
+    rating_sum = Column(Float, default=0)
+
+
+class BusinessProductStatsDailyDB(Base):
+    __tablename__ = "business_product_stats_daily"
+    business_id = Column(Integer, ForeignKey("businesses.id"), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    product_name = Column(String, primary_key=True)
+    quantity = Column(Integer, default=0)
+    revenue = Column(Float, default=0)
+
+
 class RecipeDB(Base):
     __tablename__ = "recipes"
     id = Column(Integer, primary_key=True, index=True)
@@ -191,8 +530,76 @@ class RecipeDB(Base):
     author_photo_url = Column(String, nullable=True)
     likes = Column(Integer, default=0)
     comments = Column(Integer, default=0)
+    ingredient_count = Column(Integer, nullable=True)  # farkli normalize malzeme sayisi
+    hot_score = Column(Float, default=0.0)  # bkz. "Trend skorlari"
+    search_text = Column(String, nullable=True)  # FTS5 yoksa LIKE yedeginin katlanmis metni
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_recipes_created_at_id", "created_at", "id"),
+        Index("ix_recipes_hot_score_id", "hot_score", "id"),
+        Index("ix_recipes_author_email_created_at_id", "author_email", "created_at", "id"),
+    )
+
+
+class RecipeIngredientDB(Base):
+    # Malzeme -> tarif ters indeksi. Birincil anahtar (ingredient_key, recipe_id)
+    # oldugu icin her malzemenin posting listesi indekste sirali bir id araligidir.
+    __tablename__ = "recipe_ingredients"
+    ingredient_key = Column(String, primary_key=True)
+    recipe_id = Column(Integer, ForeignKey("recipes.id"), primary_key=True, index=True)
+
+
+class RecipeSimilarDB(Base):
+    # Tarif basina onceden hesaplanmis en benzer RECIPE_SIMILAR_TOP_K tarif
+    __tablename__ = "recipe_similar"
+    recipe_id = Column(Integer, ForeignKey("recipes.id"), primary_key=True)
+    similar_recipe_id = Column(
+        Integer, ForeignKey("recipes.id"), primary_key=True, index=True
+    )
+    score = Column(Float)
+
+
+class RecipeUserCandidateDB(Base):
+    # Kullanici basina onceden hesaplanmis oneriler (item-item CF)
+    __tablename__ = "recipe_user_candidates"
+    user_email = Column(String, primary_key=True)
+    recipe_id = Column(Integer, ForeignKey("recipes.id"), primary_key=True, index=True)
+    score = Column(Float)
+
+    __table_args__ = (
+        Index("ix_recipe_user_candidates_user_score", "user_email", "score", "recipe_id"),
+    )
+
+
+class RecipeSimilarityQueueDB(Base):
+    # Benzerleri yeniden hesaplanacak (yeni/guncellenmis) tarifler
+    __tablename__ = "recipe_similarity_queue"
+    recipe_id = Column(Integer, primary_key=True)
+
+
+class RecipeSimilarityVectorDB(Base):
+    # Tarifin son hesaplanan TF-IDF satiri; refresh tum tarifleri yeniden
+    # vektorlemeden matrisi buradan kurar
+    __tablename__ = "recipe_similarity_vectors"
+    recipe_id = Column(Integer, primary_key=True)
+    vector_json = Column(String)  # {"terim": agirlik}, L2 normlu, yaygin terimler haric
+
+
+class RecipeSimilarityTermDB(Base):
+    # Son tam hesaplamadaki IDF degerleri
+    __tablename__ = "recipe_similarity_terms"
+    term = Column(String, primary_key=True)
+    idf = Column(Float)
+    common = Column(Boolean, default=False)  # RECIPE_SIMILAR_MAX_DF'ten yaygin
+
+
+class RecipeTrendingStateDB(Base):
+    # Tek satir: hot_score degerlerinin olceklendigi referans an
+    __tablename__ = "recipe_trending_state"
+    id = Column(Integer, primary_key=True)
+    epoch = Column(DateTime)
+
 
 class RecipeCommentDB(Base):
     __tablename__ = "recipe_comments"
@@ -210,7 +617,7 @@ class RecipeNotebookDB(Base):
     title = Column(String)
     cover_image_url = Column(String, nullable=True)
     owner_name = Column(String, nullable=True)
-    owner_email = Column(String, nullable=True)
+    owner_email = Column(String, nullable=True, index=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     items = relationship(
         "RecipeNotebookItemDB",
@@ -223,7 +630,7 @@ class RecipeNotebookItemDB(Base):
     __tablename__ = "recipe_notebook_items"
     id = Column(Integer, primary_key=True, index=True)
     notebook_id = Column(Integer, ForeignKey("recipe_notebooks.id"))
-    recipe_id = Column(Integer, ForeignKey("recipes.id"))
+    recipe_id = Column(Integer, ForeignKey("recipes.id"), index=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     notebook = relationship("RecipeNotebookDB", back_populates="items")
 
@@ -235,14 +642,24 @@ class RecipeLikeDB(Base):
     user_email = Column(String, index=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
+    __table_args__ = (
+        Index("ux_recipe_likes_recipe_id_user_email", "recipe_id", "user_email", unique=True),
+    )
+
 
 Base.metadata.create_all(bind=engine)
 
 
+def _existing_columns(conn, table: str) -> set:
+    inspector = sa_inspect(conn)
+    if not inspector.has_table(table):
+        return set()
+    return {column["name"] for column in inspector.get_columns(table)}
+
+
 def _ensure_business_columns():
     with engine.begin() as conn:
-        rows = conn.execute(text("PRAGMA table_info(businesses)")).fetchall()
-        existing = {row[1] for row in rows}
+        existing = _existing_columns(conn, "businesses")
         columns = {
             "min_order_amount": "REAL",
             "delivery_time_mins": "INTEGER",
@@ -260,6 +677,7 @@ def _ensure_business_columns():
             "district": "TEXT",
             "neighborhood": "TEXT",
             "open_address": "TEXT",
+            "token_version": "INTEGER",
         }
         for name, col_type in columns.items():
             if name not in existing:
@@ -271,12 +689,22 @@ def _ensure_business_columns():
 _ensure_business_columns()
 
 
+def _ensure_product_columns():
+    with engine.begin() as conn:
+        existing = _existing_columns(conn, "products")
+        for name in ("external_sku", "search_text"):
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE products ADD COLUMN {name} TEXT"))
+
+
+_ensure_product_columns()
+
+
 def _ensure_order_columns():
     with engine.begin() as conn:
-        rows = conn.execute(text("PRAGMA table_info(orders)")).fetchall()
-        if not rows:
+        existing = _existing_columns(conn, "orders")
+        if not existing:
             return
-        existing = {row[1] for row in rows}
         columns = {
             "customer_name": "TEXT",
             "customer_phone": "TEXT",
@@ -290,10 +718,12 @@ def _ensure_order_columns():
 _ensure_order_columns()
 
 
+LEGACY_RECIPE_CREATED_AT = datetime.datetime(2000, 1, 1)
+
+
 def _ensure_recipe_columns():
     with engine.begin() as conn:
-        rows = conn.execute(text("PRAGMA table_info(recipes)")).fetchall()
-        existing = {row[1] for row in rows}
+        existing = _existing_columns(conn, "recipes")
         columns = {
             "subtitle": "TEXT",
             "story": "TEXT",
@@ -312,11 +742,23 @@ def _ensure_recipe_columns():
             "author_photo_url": "TEXT",
             "likes": "INTEGER",
             "comments": "INTEGER",
+            "ingredient_count": "INTEGER",
+            "hot_score": "REAL",
+            "search_text": "TEXT",
             "created_at": "DATETIME",
         }
         for name, col_type in columns.items():
             if name not in existing:
                 conn.execute(text(f"ALTER TABLE recipes ADD COLUMN {name} {col_type}"))
+        # created_at sonradan eklendigi icin eski tariflerde NULL; keyset
+        # sayfalama (created_at < :c) NULL satirlari hic dondurmez. En eski
+        # kayitlar olarak siralansinlar diye sabit bir tarih verilir.
+        recipes = RecipeDB.__table__
+        conn.execute(
+            recipes.update()
+            .where(recipes.c.created_at.is_(None))
+            .values(created_at=LEGACY_RECIPE_CREATED_AT)
+        )
 
 
 _ensure_recipe_columns()
@@ -324,10 +766,9 @@ _ensure_recipe_columns()
 
 def _ensure_business_review_columns():
     with engine.begin() as conn:
-        rows = conn.execute(text("PRAGMA table_info(business_reviews)")).fetchall()
-        if not rows:
+        existing = _existing_columns(conn, "business_reviews")
+        if not existing:
             return
-        existing = {row[1] for row in rows}
         columns = {
             "speed_rating": "INTEGER",
             "service_rating": "INTEGER",
@@ -343,6 +784,309 @@ def _ensure_business_review_columns():
 _ensure_business_review_columns()
 
 
+def _dedupe_recipe_likes():
+    # Benzersiz (recipe_id, user_email) indeksinden ve email normalizasyonundan
+    # once: eski cift begenileri (buyuk/kucuk harf farkli olanlar dahil)
+    # temizle, sayaclari yeniden say
+    with engine.begin() as conn:
+        removed = conn.execute(
+            text(
+                "DELETE FROM recipe_likes WHERE id NOT IN ("
+                "SELECT MIN(id) FROM recipe_likes "
+                "GROUP BY recipe_id, lower(trim(user_email)))"
+            )
+        ).rowcount
+        if removed:
+            conn.execute(
+                text(
+                    "UPDATE recipes SET likes = (SELECT COUNT(*) FROM recipe_likes "
+                    "WHERE recipe_likes.recipe_id = recipes.id)"
+                )
+            )
+
+
+_dedupe_recipe_likes()
+
+
+def _normalize_email_columns():
+    # Email sutunlari kucuk harfli/trimli saklanir; sorgular lower() yerine
+    # dogrudan esitlikle indeksi kullanir. Eski kayitlar burada duzeltilir.
+    # Benzersiz sutunlarda ("Foo@x.com" ve "foo@x.com" gibi) cakisan kayitlar
+    # yeniden yazilmaz; hesaplar elle birlestirilsin diye loglanir.
+    columns = [
+        ("businesses", "email", True),
+        ("customer_profiles", "email", True),
+        ("customer_addresses", "email", False),
+        ("orders", "customer_email", False),
+        ("business_reviews", "customer_email", False),
+        ("recipes", "author_email", False),
+        ("recipe_notebooks", "owner_email", False),
+        ("recipe_likes", "user_email", False),
+    ]
+    with engine.begin() as conn:
+        conn.execute(
+            text("DROP INDEX IF EXISTS ix_orders_customer_email_lower_created_at")
+        )
+        for table, column, unique in columns:
+            normalized = f"lower(trim({column}))"
+            condition = f"{column} <> {normalized}"
+            if unique:
+                collisions = conn.execute(
+                    text(
+                        f"SELECT {normalized}, COUNT(*) FROM {table} "
+                        f"GROUP BY {normalized} HAVING COUNT(*) > 1"
+                    )
+                ).all()
+                for email, count in collisions:
+                    logger.warning(
+                        "%s.%s: %d rows collide on %r after normalization; "
+                        "left unchanged, merge them manually",
+                        table,
+                        column,
+                        count,
+                        email,
+                    )
+                if collisions:
+                    condition += (
+                        f" AND {normalized} NOT IN (SELECT {normalized} FROM {table} "
+                        f"GROUP BY {normalized} HAVING COUNT(*) > 1)"
+                    )
+            conn.execute(
+                text(f"UPDATE {table} SET {column} = {normalized} WHERE {condition}")
+            )
+
+
+_normalize_email_columns()
+
+
+def _ensure_indexes():
+    # create_all tabloyu zaten varsa atladigi icin yeni indeksler burada eklenir
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+_ensure_indexes()
+
+
+def rebuild_business_rating_stats(db: Session) -> int:
+    speed_expr = func.coalesce(
+        BusinessReviewDB.speed_rating, BusinessReviewDB.rating
+    )
+    service_expr = func.coalesce(
+        BusinessReviewDB.service_rating, BusinessReviewDB.rating
+    )
+    taste_expr = func.coalesce(
+        BusinessReviewDB.taste_rating, BusinessReviewDB.rating
+    )
+    rows = (
+        db.query(
+            BusinessReviewDB.business_id,
+            func.count(BusinessReviewDB.id),
+            func.sum(speed_expr),
+            func.sum(service_expr),
+            func.sum(taste_expr),
+        )
+        .filter(BusinessReviewDB.business_id.isnot(None))
+        .group_by(BusinessReviewDB.business_id)
+        .all()
+    )
+    db.query(BusinessRatingStatsDB).delete()
+    for business_id, count, speed_sum, service_sum, taste_sum in rows:
+        speed_sum = int(speed_sum or 0)
+        service_sum = int(service_sum or 0)
+        taste_sum = int(taste_sum or 0)
+        db.add(
+            BusinessRatingStatsDB(
+                business_id=business_id,
+                review_count=int(count or 0),
+                rating_sum=(speed_sum + service_sum + taste_sum) / 3.0,
+                speed_sum=speed_sum,
+                service_sum=service_sum,
+                taste_sum=taste_sum,
+            )
+        )
+    db.commit()
+    return len(rows)
+
+
+def _ensure_business_rating_stats():
+    # Tablo yeni olusturulduysa mevcut yorumlardan bir kez doldurulur
+    db = SessionLocal()
+    try:
+        has_stats = db.query(BusinessRatingStatsDB.business_id).first() is not None
+        has_reviews = db.query(BusinessReviewDB.id).first() is not None
+        if has_reviews and not has_stats:
+            rebuild_business_rating_stats(db)
+    finally:
+        db.close()
+
+
+_ensure_business_rating_stats()
+
+
+_GEO_CELL_DEG = 0.05  # ~5.5 km enlem
+_GEO_MAX_RADIUS_KM = 100.0  # hatali girilen dev yaricaplar indeksi sisirmesin
+_KM_PER_DEG_LAT = 111.32
+
+
+def _distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    earth_radius_km = 6371.0
+    d_lat = math.radians(lat2 - lat1)
+    d_lon = math.radians(lon2 - lon1)
+    a = (
+        math.sin(d_lat / 2) ** 2
+        + math.cos(math.radians(lat1))
+        * math.cos(math.radians(lat2))
+        * math.sin(d_lon / 2) ** 2
+    )
+    return earth_radius_km * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def _geo_cell_key(lat: float, lon: float) -> str:
+    return f"{math.floor(lat / _GEO_CELL_DEG)}:{math.floor(lon / _GEO_CELL_DEG)}"
+
+
+def _geo_cells_for_radius(lat: float, lon: float, radius_km: float) -> List[str]:
+    d_lat = radius_km / _KM_PER_DEG_LAT
+    cos_lat = max(math.cos(math.radians(lat)), 0.01)
+    d_lon = radius_km / (_KM_PER_DEG_LAT * cos_lat)
+    lat_range = range(
+        math.floor((lat - d_lat) / _GEO_CELL_DEG),
+        math.floor((lat + d_lat) / _GEO_CELL_DEG) + 1,
+    )
+    lon_range = range(
+        math.floor((lon - d_lon) / _GEO_CELL_DEG),
+        math.floor((lon + d_lon) / _GEO_CELL_DEG) + 1,
+    )
+    return [f"{i}:{j}" for i in lat_range for j in lon_range]
+
+
+def _delivery_radius_km(biz: BusinessDB) -> Optional[float]:
+    if biz.latitude is None or biz.longitude is None:
+        return None
+    if not biz.delivery_radius_km or biz.delivery_radius_km <= 0:
+        return None
+    return min(biz.delivery_radius_km, _GEO_MAX_RADIUS_KM)
+
+
+def _add_business_geo_cells(db: Session, biz: BusinessDB) -> None:
+    radius_km = _delivery_radius_km(biz)
+    if radius_km is None:
+        return
+    for cell_key in _geo_cells_for_radius(biz.latitude, biz.longitude, radius_km):
+        db.add(BusinessGeoCellDB(cell_key=cell_key, business_id=biz.id))
+
+
+def _sync_business_geo_cells(db: Session, biz: BusinessDB) -> None:
+    db.query(BusinessGeoCellDB).filter(
+        BusinessGeoCellDB.business_id == biz.id
+    ).delete()
+    _add_business_geo_cells(db, biz)
+
+
+def rebuild_business_geo_cells(db: Session) -> int:
+    db.query(BusinessGeoCellDB).delete()
+    businesses = (
+        db.query(BusinessDB)
+        .filter(
+            BusinessDB.latitude.isnot(None),
+            BusinessDB.longitude.isnot(None),
+            BusinessDB.delivery_radius_km > 0,
+        )
+        .all()
+    )
+    for biz in businesses:
+        _add_business_geo_cells(db, biz)
+    db.commit()
+    return len(businesses)
+
+
+def _ensure_business_geo_cells():
+    db = SessionLocal()
+    try:
+        has_cells = db.query(BusinessGeoCellDB.cell_key).first() is not None
+        has_located = (
+            db.query(BusinessDB.id)
+            .filter(BusinessDB.delivery_radius_km > 0)
+            .first()
+            is not None
+        )
+        if has_located and not has_cells:
+            rebuild_business_geo_cells(db)
+    finally:
+        db.close()
+
+
+_ensure_business_geo_cells()
+
+
+# --- Tarif / urun arama indeksleri (SQLite FTS5) ---
+# Metin indekslenmeden once Turkce kurallariyla katlanir (İ/I/ı -> i) ve
+# aksanlari atilir; "IZGARA", "ızgara", "izgara" ve "sut"/"süt" eslesir.
+_TURKISH_FOLD = str.maketrans({"İ": "i", "I": "i", "ı": "i"})
+
+
+def _fold_search_text(value: Optional[str]) -> str:
+    if not value:
+        return ""
+    folded = unicodedata.normalize("NFKD", value.translate(_TURKISH_FOLD).lower())
+    return "".join(ch for ch in folded if not unicodedata.combining(ch))
+
+
+def _ensure_search_index(table: str, columns: str) -> bool:
+    if not IS_SQLITE:
+        return False
+    try:
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+                    f"{columns}, tokenize = 'unicode61 remove_diacritics 2')"
+                )
+            )
+    except Exception:
+        return False  # FTS5 derlenmemis SQLite: LIKE yedegi kullanilir
+    return True
+
+
+RECIPE_FTS_ENABLED = _ensure_search_index(
+    "recipes_fts", "title, subtitle, story, category, ingredients, steps"
+)
+PRODUCT_FTS_ENABLED = _ensure_search_index("products_fts", "name, description, category")
+
+
+# --- Malzeme normalizasyonu ---
+# "2 su bardağı Un (elenmiş)" -> "un", "1 yemek kaşığı zeytin yağı" -> "zeytinyagi".
+# Miktar, olcu birimi ve parantez/virgul sonrasi aciklamalar atilir; kalan
+# kelimeler bitisik yazilir ki "zeytin yağı" ile "zeytinyağı" ayni anahtara dussun.
+_INGREDIENT_UNIT_PHRASES = re.compile(
+    r"\b(su|yemek|cay|tatli|kahve) (bardagi|kasigi|fincani)\b"
+)
+_INGREDIENT_STOPWORDS = {
+    "bardak", "bardagi", "kasik", "kasigi", "fincan", "fincani", "kase", "kasesi",
+    "g", "gr", "gram", "kg", "kilo", "ml", "cl", "l", "lt", "litre",
+    "adet", "tane", "tutam", "tutami", "demet", "demeti", "dis", "disi",
+    "dilim", "dilimi", "paket", "paketi", "kutu", "kutusu", "avuc",
+    "buyuk", "orta", "kucuk", "boy", "yarim", "ceyrek", "bucuk",
+    "bir", "iki", "uc", "dort", "bes", "alti", "yedi", "sekiz", "dokuz", "on",
+    "biraz", "istege", "gore", "kadar",
+}
+
+
+def _normalize_ingredient(value: Optional[str]) -> Optional[str]:
+    folded = _fold_search_text(value)
+    folded = re.sub(r"\([^)]*\)", " ", folded).split(",")[0]
+    folded = _INGREDIENT_UNIT_PHRASES.sub(" ", folded)
+    words = [
+        word
+        for word in re.split(r"[^a-z]+", folded)
+        if word and word not in _INGREDIENT_STOPWORDS
+    ]
+    return "".join(words) or None
+
+
 # --- Pydantic Schemas ---
 class BusinessRegister(BaseModel):
     email: str
@@ -394,6 +1138,10 @@ class BusinessPublic(BaseModel):
         from_attributes = True
 
 
+class BusinessNearby(BusinessPublic):
+    distance_km: float
+
+
 class BusinessProfile(BusinessPublic):
     working_hours: Optional[str] = None
     authorized_name: Optional[str] = None
@@ -413,6 +1161,24 @@ class BusinessLogin(BaseModel):
     password: str
 
 
+class BusinessLoginOut(BusinessProfile):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+    expires_in: int
+
+
+class BusinessTokenRefresh(BaseModel):
+    refresh_token: str
+
+
+class BusinessTokenOut(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+    expires_in: int
+
+
 class BusinessProfileUpdate(BaseModel):
     address: Optional[str] = None
     phone: Optional[str] = None
@@ -471,10 +1237,62 @@ class ProductCreate(BaseModel):
     is_available: bool = True
 
 
+class ProductImportRow(BaseModel):
+    sku: str
+    name: str
+    description: str = ""
+    price: float
+    category: str = ""
+    image_url: Optional[str] = None
+    is_available: bool = True
+
+    class Config:
+        coerce_numbers_to_str = True  # JSON'da SKU sayi olarak gelebilir
+
+
+class ProductImportError(BaseModel):
+    row: int
+    sku: Optional[str] = None
+    error: str
+
+
+class ProductImportReport(BaseModel):
+    processed: int
+    created: int
+    updated: int
+    failed: int
+    duplicates: int = 0  # ayni SKU'nun dosyada tekrar eden (ezilen) satirlari
+    errors: List[ProductImportError]
+    errors_truncated: bool = False
+
+
+class ProductOut(BaseModel):
+    id: int
+    business_id: int
+    name: str
+    description: Optional[str] = None
+    price: float
+    category: Optional[str] = None
+    image_url: Optional[str] = None
+    is_available: bool = True
+    external_sku: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ProductSearchGroup(BaseModel):
+    business: BusinessPublic
+    products: List[ProductOut]
+
+
 class OrderItemCreate(BaseModel):
-    product_name: str
+    # Fiyat ve ad sunucuda ProductDB'den alinir; product_id gondermeyen eski
+    # istemciler icin urun isletme icinde adiyla eslenir
+    product_id: Optional[int] = None
+    product_name: Optional[str] = None
     quantity: int
-    price: float
+    price: Optional[float] = None  # yok sayilir
 
 
 class OrderCreate(BaseModel):
@@ -484,7 +1302,7 @@ class OrderCreate(BaseModel):
     customer_phone: Optional[str] = None
     customer_address: str
     customer_note: Optional[str] = None
-    total_price: float
+    total_price: Optional[float] = None  # verilirse sunucu toplamiyla eslesmeli
     items: List[OrderItemCreate]
 
 
@@ -515,6 +1333,10 @@ class ReorderItem(BaseModel):
     sequence: int
 
 
+class ProductMove(BaseModel):
+    after_id: Optional[int] = None  # None: menunun en basina
+
+
 class OrderStatusUpdate(BaseModel):
     status: str
     reason: Optional[str] = None
@@ -529,6 +1351,30 @@ class BusinessReviewCreate(BaseModel):
     comment: Optional[str] = None
 
 
+class BusinessAnalyticsBucket(BaseModel):
+    bucket: datetime.datetime
+    order_count: int = 0
+    revenue: float = 0
+    cancelled_count: int = 0
+    review_count: int = 0
+    rating_avg: Optional[float] = None
+
+
+class BusinessAnalyticsProduct(BaseModel):
+    product_name: str
+    quantity: int
+    revenue: float
+
+
+class BusinessAnalyticsOut(BaseModel):
+    start: datetime.date
+    end: datetime.date
+    granularity: str
+    totals: BusinessAnalyticsBucket
+    series: List[BusinessAnalyticsBucket]
+    top_products: List[BusinessAnalyticsProduct]
+
+
 class BusinessReviewOut(BaseModel):
     id: int
     business_id: int
@@ -589,11 +1435,46 @@ class RecipeOut(BaseModel):
     is_liked: Optional[bool] = None
 
 
-class RecipeUpdate(BaseModel):
-    user_email: Optional[str] = None
-    title: Optional[str] = None
+class PantrySearch(BaseModel):
+    ingredients: List[str]
+    viewer_email: Optional[str] = None
+    max_missing: Optional[int] = None
+    sort: str = "missing"  # "missing" | "coverage"
+    limit: int = 20
+    offset: int = 0
+
+
+class PantryRecipeOut(RecipeOut):
+    matched_count: int
+    missing_count: int
+    missing_ingredients: List[str] = []
+
+
+class RecipeSummaryOut(BaseModel):
+    # Akis kartlari icin: buyuk metin/JSON kolonlari (hikaye, malzemeler,
+    # adimlar, galeri) hic okunmaz
+    id: int
+    title: str
     subtitle: Optional[str] = None
-    story: Optional[str] = None
+    category: Optional[str] = None
+    prep_time: Optional[str] = None
+    cook_time: Optional[str] = None
+    cover_image_url: Optional[str] = None
+    author_name: str
+    author_email: str
+    author_photo_url: Optional[str] = None
+    likes: int
+    comments: int
+    saves: int
+    created_at: datetime.datetime
+    is_liked: Optional[bool] = None
+
+
+class RecipeUpdate(BaseModel):
+    user_email: Optional[str] = None
+    title: Optional[str] = None
+    subtitle: Optional[str] = None
+    story: Optional[str] = None
     ingredients: Optional[List[str]] = None
     steps: Optional[List[str]] = None
     category: Optional[str] = None
@@ -655,6 +1536,20 @@ class RecipeNotebookOut(BaseModel):
 
 # --- FastAPI App ---
 app = FastAPI()
+# Sayfali listelerin devam imleci X-Next-Cursor basligindadir; tarayici
+# istemcileri basligi ancak expose_headers ile okuyabilir
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.environ.get("EATY_CORS_ORIGINS", "*").split(",")
+    if origin.strip()
+]
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=CORS_ORIGINS,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
+)
 
 
 def get_db():
@@ -665,6 +1560,49 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def _db_endpoint(func):
+    # Sync modda endpoint aynen kalir. Async modda ayni govde AsyncSession.run_sync
+    # ile greenlet icinde calisir: thread tutulmaz, I/O event loop'ta beklenir.
+    if not ASYNC_DB:
+        return func
+    signature = inspect.signature(func)
+    parameters = [
+        param.replace(default=Depends(get_async_db), annotation=AsyncSession)
+        if param.name == "db"
+        else param
+        for param in signature.parameters.values()
+    ]
+
+    @functools.wraps(func)
+    async def endpoint(*args, db, **kwargs):
+        return await db.run_sync(lambda session: func(*args, db=session, **kwargs))
+
+    endpoint.__signature__ = signature.replace(parameters=parameters)
+    return endpoint
+
+
+def get_business_claims(authorization: Optional[str] = Header(None)) -> Optional[dict]:
+    if not authorization:
+        if REQUIRE_BUSINESS_TOKEN:
+            raise HTTPException(status_code=401, detail="Missing access token")
+        return None
+    scheme, _, token = authorization.partition(" ")
+    claims = _verify_token(token.strip(), "access") if scheme.lower() == "bearer" else None
+    if claims is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired access token")
+    return claims
+
+
+def _authorize_business(claims: Optional[dict], business_id: Optional[int]) -> None:
+    if claims is not None and claims.get("sub") != business_id:
+        raise HTTPException(status_code=403, detail="Not allowed for this business")
+
+
 def _parse_json_list(raw: Optional[str]) -> List[str]:
     if not raw:
         return []
@@ -677,6 +1615,57 @@ def _parse_json_list(raw: Optional[str]) -> List[str]:
     return []
 
 
+def _encode_cursor(created_at: datetime.datetime, row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _created_cursor_filter(model, cursor: str):
+    cursor_created_at, cursor_id = _decode_cursor(cursor)
+    return or_(
+        model.created_at < cursor_created_at,
+        and_(model.created_at == cursor_created_at, model.id < cursor_id),
+    )
+
+
+def _fetch_created_page(
+    query, model, response: Response, limit: int, cursor: Optional[str]
+) -> list:
+    # (created_at, id) azalan sirali sorgudan bir sayfa; devami varsa
+    # X-Next-Cursor yazilir.
+    limit = max(1, min(limit, 100))
+    if cursor:
+        query = query.filter(_created_cursor_filter(model, cursor))
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows
+
+
+def _encode_score_cursor(score: float, row_id: int) -> str:
+    raw = json.dumps([score, row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_score_cursor(cursor: str) -> tuple[float, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(score), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 def _get_recipe_comment_counts(
     db: Session,
     recipe_ids: List[int],
@@ -704,12 +1693,13 @@ def _get_recipe_save_counts(db: Session, recipe_ids: List[int]) -> dict[int, int
     return {int(row[0]): int(row[1]) for row in rows}
 
 
-def _recipe_to_out(
+def _recipe_counters(
     recipe: RecipeDB,
-    liked_ids: Optional[set] = None,
-    comment_counts: Optional[dict[int, int]] = None,
-    save_counts: Optional[dict[int, int]] = None,
-) -> RecipeOut:
+    liked_ids: Optional[set],
+    comment_counts: Optional[dict[int, int]],
+    save_counts: Optional[dict[int, int]],
+    like_counts: Optional[dict[int, int]],
+) -> tuple[Optional[bool], int, int, int]:
     is_liked = None
     if liked_ids is not None:
         is_liked = recipe.id in liked_ids
@@ -721,6 +1711,24 @@ def _recipe_to_out(
     save_count = (
         save_counts.get(recipe.id, 0) if save_counts is not None else 0
     )
+    like_count = (
+        like_counts.get(recipe.id, recipe.likes or 0)
+        if like_counts is not None
+        else (recipe.likes or 0)
+    )
+    return is_liked, comment_count, save_count, like_count
+
+
+def _recipe_to_out(
+    recipe: RecipeDB,
+    liked_ids: Optional[set] = None,
+    comment_counts: Optional[dict[int, int]] = None,
+    save_counts: Optional[dict[int, int]] = None,
+    like_counts: Optional[dict[int, int]] = None,
+) -> RecipeOut:
+    is_liked, comment_count, save_count, like_count = _recipe_counters(
+        recipe, liked_ids, comment_counts, save_counts, like_counts
+    )
     return RecipeOut(
         id=recipe.id,
         title=recipe.title,
@@ -739,7 +1747,55 @@ def _recipe_to_out(
         author_name=recipe.author_name,
         author_email=recipe.author_email,
         author_photo_url=recipe.author_photo_url,
-        likes=recipe.likes or 0,
+        likes=like_count,
+        comments=comment_count,
+        saves=save_count,
+        created_at=recipe.created_at,
+        is_liked=is_liked,
+    )
+
+
+# view=summary listelerinde SELECT'e yalnizca bu kolonlar girer
+_RECIPE_SUMMARY_COLUMNS = (
+    RecipeDB.id,
+    RecipeDB.title,
+    RecipeDB.subtitle,
+    RecipeDB.category,
+    RecipeDB.prep_time,
+    RecipeDB.cook_time,
+    RecipeDB.cover_image_url,
+    RecipeDB.author_name,
+    RecipeDB.author_email,
+    RecipeDB.author_photo_url,
+    RecipeDB.likes,
+    RecipeDB.comments,
+    RecipeDB.hot_score,
+    RecipeDB.created_at,
+)
+
+
+def _recipe_to_summary_out(
+    recipe: RecipeDB,
+    liked_ids: Optional[set] = None,
+    comment_counts: Optional[dict[int, int]] = None,
+    save_counts: Optional[dict[int, int]] = None,
+    like_counts: Optional[dict[int, int]] = None,
+) -> RecipeSummaryOut:
+    is_liked, comment_count, save_count, like_count = _recipe_counters(
+        recipe, liked_ids, comment_counts, save_counts, like_counts
+    )
+    return RecipeSummaryOut(
+        id=recipe.id,
+        title=recipe.title,
+        subtitle=recipe.subtitle,
+        category=recipe.category,
+        prep_time=recipe.prep_time,
+        cook_time=recipe.cook_time,
+        cover_image_url=recipe.cover_image_url,
+        author_name=recipe.author_name,
+        author_email=recipe.author_email,
+        author_photo_url=recipe.author_photo_url,
+        likes=like_count,
         comments=comment_count,
         saves=save_count,
         created_at=recipe.created_at,
@@ -747,6 +1803,225 @@ def _recipe_to_out(
     )
 
 
+def _recipe_search_text(recipe: RecipeDB) -> str:
+    return _fold_search_text(
+        " ".join(
+            [recipe.title or "", recipe.category or ""]
+            + _parse_json_list(recipe.ingredients_json)
+        )
+    )
+
+
+def _index_recipe_for_search(db: Session, recipe: RecipeDB) -> None:
+    if not RECIPE_FTS_ENABLED:
+        # LIKE yedegi sorgu gibi katlanmis metinde arar; ingredients_json'daki
+        # \u kacislari ve lower()'in Turkce harfleri katlamamasi sorun olmaz
+        recipe.search_text = _recipe_search_text(recipe)
+        return
+    db.execute(text("DELETE FROM recipes_fts WHERE rowid = :id"), {"id": recipe.id})
+    db.execute(
+        text(
+            "INSERT INTO recipes_fts "
+            "(rowid, title, subtitle, story, category, ingredients, steps) "
+            "VALUES (:id, :title, :subtitle, :story, :category, :ingredients, :steps)"
+        ),
+        {
+            "id": recipe.id,
+            "title": _fold_search_text(recipe.title),
+            "subtitle": _fold_search_text(recipe.subtitle),
+            "story": _fold_search_text(recipe.story),
+            "category": _fold_search_text(recipe.category),
+            "ingredients": _fold_search_text(
+                " ".join(_parse_json_list(recipe.ingredients_json))
+            ),
+            "steps": _fold_search_text(" ".join(_parse_json_list(recipe.steps_json))),
+        },
+    )
+
+
+def _remove_recipe_from_search(db: Session, recipe_id: int) -> None:
+    if RECIPE_FTS_ENABLED:
+        db.execute(text("DELETE FROM recipes_fts WHERE rowid = :id"), {"id": recipe_id})
+
+
+def rebuild_recipe_search_index(db: Session) -> int:
+    if RECIPE_FTS_ENABLED:
+        db.execute(text("DELETE FROM recipes_fts"))
+    count = 0
+    for recipe in db.query(RecipeDB).yield_per(500):
+        _index_recipe_for_search(db, recipe)
+        count += 1
+    db.commit()
+    return count
+
+
+def _ensure_recipe_search_backfill():
+    db = SessionLocal()
+    try:
+        if RECIPE_FTS_ENABLED:
+            indexed = db.execute(text("SELECT rowid FROM recipes_fts LIMIT 1")).first()
+            missing = indexed is None and db.query(RecipeDB.id).first() is not None
+        else:
+            missing = (
+                db.query(RecipeDB.id).filter(RecipeDB.search_text.is_(None)).first()
+                is not None
+            )
+        if missing:
+            rebuild_recipe_search_index(db)
+    finally:
+        db.close()
+
+
+_ensure_recipe_search_backfill()
+
+
+def _index_recipe_ingredients(db: Session, recipe: RecipeDB) -> None:
+    keys = set()
+    for ingredient in _parse_json_list(recipe.ingredients_json):
+        key = _normalize_ingredient(ingredient)
+        if key:
+            keys.add(key)
+    db.query(RecipeIngredientDB).filter(
+        RecipeIngredientDB.recipe_id == recipe.id
+    ).delete(synchronize_session=False)
+    if keys:
+        db.execute(
+            RecipeIngredientDB.__table__.insert(),
+            [{"ingredient_key": key, "recipe_id": recipe.id} for key in sorted(keys)],
+        )
+    recipe.ingredient_count = len(keys)
+
+
+def rebuild_recipe_ingredient_index(db: Session, only_missing: bool = False) -> int:
+    query = db.query(RecipeDB)
+    if only_missing:
+        query = query.filter(RecipeDB.ingredient_count.is_(None))
+    else:
+        db.query(RecipeIngredientDB).delete(synchronize_session=False)
+    count = 0
+    for recipe in query.yield_per(500):
+        _index_recipe_ingredients(db, recipe)
+        count += 1
+    db.commit()
+    return count
+
+
+def _ensure_recipe_ingredient_backfill():
+    # ingredient_count NULL olan tarifler henuz indekslenmemis demektir
+    db = SessionLocal()
+    try:
+        pending = (
+            db.query(RecipeDB.id).filter(RecipeDB.ingredient_count.is_(None)).first()
+        )
+        if pending is not None:
+            rebuild_recipe_ingredient_index(db, only_missing=True)
+    finally:
+        db.close()
+
+
+_ensure_recipe_ingredient_backfill()
+
+
+def _product_search_text(
+    name: Optional[str], description: Optional[str], category: Optional[str]
+) -> str:
+    return _fold_search_text(" ".join([name or "", description or "", category or ""]))
+
+
+def _index_product_for_search(db: Session, product: ProductDB) -> None:
+    if not PRODUCT_FTS_ENABLED:
+        product.search_text = _product_search_text(
+            product.name, product.description, product.category
+        )
+        return
+    db.execute(text("DELETE FROM products_fts WHERE rowid = :id"), {"id": product.id})
+    db.execute(
+        text(
+            "INSERT INTO products_fts (rowid, name, description, category) "
+            "VALUES (:id, :name, :description, :category)"
+        ),
+        {
+            "id": product.id,
+            "name": _fold_search_text(product.name),
+            "description": _fold_search_text(product.description),
+            "category": _fold_search_text(product.category),
+        },
+    )
+
+
+def _remove_product_from_search(db: Session, product_id: int) -> None:
+    if PRODUCT_FTS_ENABLED:
+        db.execute(text("DELETE FROM products_fts WHERE rowid = :id"), {"id": product_id})
+
+
+def rebuild_product_search_index(db: Session) -> int:
+    if PRODUCT_FTS_ENABLED:
+        db.execute(text("DELETE FROM products_fts"))
+    count = 0
+    for product in db.query(ProductDB).yield_per(500):
+        _index_product_for_search(db, product)
+        count += 1
+    db.commit()
+    return count
+
+
+def _ensure_product_search_backfill():
+    db = SessionLocal()
+    try:
+        if PRODUCT_FTS_ENABLED:
+            indexed = db.execute(text("SELECT rowid FROM products_fts LIMIT 1")).first()
+            missing = indexed is None and db.query(ProductDB.id).first() is not None
+        else:
+            missing = (
+                db.query(ProductDB.id).filter(ProductDB.search_text.is_(None)).first()
+                is not None
+            )
+        if missing:
+            rebuild_product_search_index(db)
+    finally:
+        db.close()
+
+
+_ensure_product_search_backfill()
+
+
+def _recipes_to_out(
+    db: Session,
+    recipes: List[RecipeDB],
+    viewer_email: Optional[str] = None,
+    summary: bool = False,
+) -> List[Union[RecipeOut, RecipeSummaryOut]]:
+    recipe_ids = [recipe.id for recipe in recipes]
+    liked_ids = None
+    if viewer_email:
+        normalized_viewer = viewer_email.strip().lower()
+        liked_rows = (
+            db.query(RecipeLikeDB.recipe_id)
+            .filter(
+                RecipeLikeDB.user_email == normalized_viewer,
+                RecipeLikeDB.recipe_id.in_(recipe_ids),
+            )
+            .all()
+            if recipe_ids
+            else []
+        )
+        liked_ids = {row[0] for row in liked_rows}
+    comment_counts = _get_recipe_comment_counts(db, recipe_ids)
+    save_counts = _get_recipe_save_counts(db, recipe_ids)
+    like_counts = recipe_like_counter.current(db, recipe_ids)
+    to_out = _recipe_to_summary_out if summary else _recipe_to_out
+    return [
+        to_out(
+            recipe,
+            liked_ids,
+            comment_counts=comment_counts,
+            save_counts=save_counts,
+            like_counts=like_counts,
+        )
+        for recipe in recipes
+    ]
+
+
 def _notebook_to_out(notebook: RecipeNotebookDB) -> RecipeNotebookOut:
     return RecipeNotebookOut(
         id=notebook.id,
@@ -774,51 +2049,48 @@ def _address_to_out(address: CustomerAddressDB) -> CustomerAddressOut:
     )
 
 
+def _apply_review_to_rating_stats(
+    db: Session, business_id: int, speed: int, service: int, taste: int
+) -> None:
+    # Isletmenin es zamanli ilk iki yorumu ayni satiri eklemeye calismasin diye
+    # rollup'larla ayni ON CONFLICT artirimi kullanilir
+    _bump_rollup(
+        db,
+        BusinessRatingStatsDB,
+        (business_id,),
+        review_count=1,
+        rating_sum=(speed + service + taste) / 3.0,
+        speed_sum=speed,
+        service_sum=service,
+        taste_sum=taste,
+    )
+
+
 def _attach_business_ratings(db: Session, businesses: List[BusinessDB]) -> None:
     if not businesses:
         return
     ids = [biz.id for biz in businesses]
-    speed_expr = func.coalesce(
-        BusinessReviewDB.speed_rating, BusinessReviewDB.rating
-    )
-    service_expr = func.coalesce(
-        BusinessReviewDB.service_rating, BusinessReviewDB.rating
-    )
-    taste_expr = func.coalesce(
-        BusinessReviewDB.taste_rating, BusinessReviewDB.rating
-    )
-    avg_expr = (speed_expr + service_expr + taste_expr) / 3.0
     rows = (
-        db.query(
-            BusinessReviewDB.business_id,
-            func.avg(avg_expr),
-            func.count(BusinessReviewDB.id),
-            func.avg(speed_expr),
-            func.avg(service_expr),
-            func.avg(taste_expr),
-        )
-        .filter(BusinessReviewDB.business_id.in_(ids))
-        .group_by(BusinessReviewDB.business_id)
+        db.query(BusinessRatingStatsDB)
+        .filter(BusinessRatingStatsDB.business_id.in_(ids))
         .all()
     )
-    by_id = {row[0]: row[1:] for row in rows}
+    by_id = {row.business_id: row for row in rows}
     for biz in businesses:
         stats = by_id.get(biz.id)
-        if not stats:
+        count = int(stats.review_count or 0) if stats else 0
+        if not count:
             biz.rating_avg = None
             biz.rating_count = 0
             biz.rating_speed_avg = None
             biz.rating_service_avg = None
             biz.rating_taste_avg = None
             continue
-        avg, count, speed_avg, service_avg, taste_avg = stats
-        biz.rating_avg = float(avg) if avg is not None else None
-        biz.rating_count = int(count or 0)
-        biz.rating_speed_avg = float(speed_avg) if speed_avg is not None else None
-        biz.rating_service_avg = (
-            float(service_avg) if service_avg is not None else None
-        )
-        biz.rating_taste_avg = float(taste_avg) if taste_avg is not None else None
+        biz.rating_avg = float(stats.rating_sum or 0) / count
+        biz.rating_count = count
+        biz.rating_speed_avg = float(stats.speed_sum or 0) / count
+        biz.rating_service_avg = float(stats.service_sum or 0) / count
+        biz.rating_taste_avg = float(stats.taste_sum or 0) / count
 
 
 _DAY_KEYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
@@ -829,6 +2101,165 @@ def _turkey_now() -> datetime.datetime:
     return datetime.datetime.utcnow() + _TURKEY_UTC_OFFSET
 
 
+# --- Isletme analitigi (saatlik/gunluk rollup) ---
+# Siparis verildiginde, iptal edildiginde (ya da iptal geri alindiginda) ve
+# yorum yazildiginda ilgili saat ve gun satirlari artimli guncellenir; panel
+# endpoint'i ham siparisleri degil bu satirlari okur. Siparisler olusturulma
+# anlarinin kovasina, yorumlar yazildiklari anin kovasina yazilir.
+ORDER_CANCELLED_STATUS = "İptal Edildi"
+
+
+def _analytics_buckets(moment: datetime.datetime) -> tuple[datetime.datetime, datetime.datetime]:
+    local = moment + _TURKEY_UTC_OFFSET
+    hour = local.replace(minute=0, second=0, microsecond=0)
+    return hour, hour.replace(hour=0)
+
+
+def _bump_rollup(db: Session, model, key: tuple, **deltas) -> None:
+    # Tek ifadelik upsert (INSERT ... ON CONFLICT DO UPDATE): ayni kovaya es
+    # zamanli ilk siparisler birbirinin satirini eklemeye calisip cakismaz
+    table = model.__table__
+    columns = [column.name for column in table.primary_key.columns]
+    insert = sqlite_insert if IS_SQLITE else postgresql_insert
+    statement = insert(table).values(**dict(zip(columns, key)), **deltas)
+    statement = statement.on_conflict_do_update(
+        index_elements=columns,
+        set_={
+            name: func.coalesce(table.c[name], 0) + statement.excluded[name]
+            for name in deltas
+        },
+    )
+    db.execute(statement)
+
+
+def _record_order_rollup(
+    db: Session,
+    business_id: int,
+    created_at: datetime.datetime,
+    total_price: float,
+    items: List[dict],
+    placed: int = 0,
+    cancelled: int = 0,
+) -> None:
+    # placed=1: yeni siparis; cancelled=+1/-1: iptal edildi / iptal geri alindi
+    hour, day = _analytics_buckets(created_at)
+    sign = placed - cancelled
+    for model, bucket in ((BusinessStatsHourlyDB, hour), (BusinessStatsDailyDB, day)):
+        _bump_rollup(
+            db,
+            model,
+            (business_id, bucket),
+            order_count=placed,
+            revenue=sign * (total_price or 0),
+            cancelled_count=cancelled,
+        )
+    quantities: dict = collections.defaultdict(lambda: [0, 0.0])
+    for item in items:
+        totals = quantities[item["product_name"]]
+        totals[0] += item["quantity"] or 0
+        totals[1] += (item["quantity"] or 0) * (item["price"] or 0)
+    for product_name, (quantity, revenue) in quantities.items():
+        _bump_rollup(
+            db,
+            BusinessProductStatsDailyDB,
+            (business_id, day, product_name),
+            quantity=sign * quantity,
+            revenue=sign * revenue,
+        )
+
+
+def _record_review_rollup(
+    db: Session, business_id: int, moment: datetime.datetime, rating: float
+) -> None:
+    hour, day = _analytics_buckets(moment)
+    for model, bucket in ((BusinessStatsHourlyDB, hour), (BusinessStatsDailyDB, day)):
+        _bump_rollup(db, model, (business_id, bucket), review_count=1, rating_sum=rating)
+
+
+def rebuild_business_analytics(db: Session) -> int:
+    for model in (BusinessStatsHourlyDB, BusinessStatsDailyDB, BusinessProductStatsDailyDB):
+        db.query(model).delete(synchronize_session=False)
+    metrics = ("order_count", "revenue", "cancelled_count", "review_count", "rating_sum")
+    stats = {
+        BusinessStatsHourlyDB: collections.defaultdict(lambda: dict.fromkeys(metrics, 0)),
+        BusinessStatsDailyDB: collections.defaultdict(lambda: dict.fromkeys(metrics, 0)),
+    }
+    products: dict = collections.defaultdict(lambda: {"quantity": 0, "revenue": 0.0})
+    orders = (
+        db.query(OrderDB)
+        .options(selectinload(OrderDB.items))
+        .filter(OrderDB.created_at.isnot(None))
+        .yield_per(500)
+    )
+    count = 0
+    for order in orders:
+        count += 1
+        cancelled = order.status == ORDER_CANCELLED_STATUS
+        hour, day = _analytics_buckets(order.created_at)
+        for model, bucket in ((BusinessStatsHourlyDB, hour), (BusinessStatsDailyDB, day)):
+            row = stats[model][(order.business_id, bucket)]
+            row["order_count"] += 1
+            row["cancelled_count"] += int(cancelled)
+            if not cancelled:
+                row["revenue"] += order.total_price or 0
+        if not cancelled:
+            for item in order.items:
+                row = products[(order.business_id, day, item.product_name)]
+                row["quantity"] += item.quantity or 0
+                row["revenue"] += (item.quantity or 0) * (item.price or 0)
+    speed_expr = func.coalesce(BusinessReviewDB.speed_rating, BusinessReviewDB.rating)
+    service_expr = func.coalesce(BusinessReviewDB.service_rating, BusinessReviewDB.rating)
+    taste_expr = func.coalesce(BusinessReviewDB.taste_rating, BusinessReviewDB.rating)
+    reviews = db.query(
+        BusinessReviewDB.business_id,
+        BusinessReviewDB.created_at,
+        (speed_expr + service_expr + taste_expr) / 3.0,
+    ).filter(BusinessReviewDB.created_at.isnot(None))
+    for business_id, created_at, rating in reviews.yield_per(1000):
+        hour, day = _analytics_buckets(created_at)
+        for model, bucket in ((BusinessStatsHourlyDB, hour), (BusinessStatsDailyDB, day)):
+            row = stats[model][(business_id, bucket)]
+            row["review_count"] += 1
+            row["rating_sum"] += rating or 0
+    for model, rows in stats.items():
+        if rows:
+            db.execute(
+                model.__table__.insert(),
+                [
+                    {"business_id": business_id, "bucket": bucket, **values}
+                    for (business_id, bucket), values in rows.items()
+                ],
+            )
+    if products:
+        db.execute(
+            BusinessProductStatsDailyDB.__table__.insert(),
+            [
+                {
+                    "business_id": business_id,
+                    "bucket": bucket,
+                    "product_name": product_name,
+                    **values,
+                }
+                for (business_id, bucket, product_name), values in products.items()
+            ],
+        )
+    db.commit()
+    return count
+
+
+def _ensure_business_analytics_backfill():
+    db = SessionLocal()
+    try:
+        has_rollups = db.query(BusinessStatsDailyDB.business_id).first() is not None
+        if not has_rollups and db.query(OrderDB.id).first() is not None:
+            rebuild_business_analytics(db)
+    finally:
+        db.close()
+
+
+_ensure_business_analytics_backfill()
+
+
 def _time_to_minutes(value: str) -> Optional[int]:
     parts = value.strip().split(":")
     if len(parts) != 2:
@@ -843,9 +2274,10 @@ def _time_to_minutes(value: str) -> Optional[int]:
     return hour * 60 + minute
 
 
-def _is_within_working_hours(
-    working_hours: Optional[str], now: Optional[datetime.datetime] = None
-) -> Optional[bool]:
+def _compile_working_hours(working_hours: Optional[str]) -> Optional[tuple]:
+    # JSON calisma saatleri gun basina tek elemana derlenir:
+    # False = kapali, True = 24 saat acik, (acilis_dk, kapanis_dk) = aralik.
+    # None = takvim yok (sadece manuel acik/kapali gecerli).
     if not working_hours:
         return None
     try:
@@ -854,42 +2286,360 @@ def _is_within_working_hours(
         return None
     if not isinstance(data, dict):
         return None
-    current = now or _turkey_now()
-    day_key = _DAY_KEYS[current.weekday()]
-    day_data = data.get(day_key)
-    if not isinstance(day_data, dict):
-        return False
-    if day_data.get("closed") is True:
-        return False
-    open_str = day_data.get("open")
-    close_str = day_data.get("close")
-    if not open_str or not close_str:
-        return False
-    open_minutes = _time_to_minutes(str(open_str))
-    close_minutes = _time_to_minutes(str(close_str))
-    if open_minutes is None or close_minutes is None:
-        return False
-    if open_minutes == close_minutes:
-        return True
-    now_minutes = current.hour * 60 + current.minute
+    days = []
+    for day_key in _DAY_KEYS:
+        day_data = data.get(day_key)
+        if not isinstance(day_data, dict) or day_data.get("closed") is True:
+            days.append(False)
+            continue
+        open_str = day_data.get("open")
+        close_str = day_data.get("close")
+        if not open_str or not close_str:
+            days.append(False)
+            continue
+        open_minutes = _time_to_minutes(str(open_str))
+        close_minutes = _time_to_minutes(str(close_str))
+        if open_minutes is None or close_minutes is None:
+            days.append(False)
+        elif open_minutes == close_minutes:
+            days.append(True)
+        else:
+            days.append((open_minutes, close_minutes))
+    return tuple(days)
+
+
+def _schedule_is_open(schedule: tuple, now: datetime.datetime) -> bool:
+    day = schedule[now.weekday()]
+    if day is True or day is False:
+        return day
+    open_minutes, close_minutes = day
+    now_minutes = now.hour * 60 + now.minute
     if open_minutes < close_minutes:
         return open_minutes <= now_minutes < close_minutes
     return now_minutes >= open_minutes or now_minutes < close_minutes
 
 
+def _schedule_next_transition(
+    schedule: tuple, now: datetime.datetime
+) -> datetime.datetime:
+    # Sonuc sadece o gunun acilis/kapanis dakikalarinda ve gun degisiminde
+    # degisebilir; bunlardan now'dan sonraki ilki.
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    candidates = [midnight + datetime.timedelta(days=1)]
+    day = schedule[now.weekday()]
+    if isinstance(day, tuple):
+        candidates.extend(midnight + datetime.timedelta(minutes=m) for m in day)
+    return min(c for c in candidates if c > now)
+
+
+class WorkingHoursIndex:
+    # Isletme basina derlenmis takvim + onbellekli "takvime gore acik" bayragi.
+    # Bayraklar bir sonraki gecis anina kadar gecerlidir; gecis anlari bir
+    # min-heap'te tutulur ve sadece zamani gelenler yeniden hesaplanir.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._raw: dict = {}
+        self._schedules: dict = {}
+        self._flags: dict = {}
+        self._transitions: dict = {}
+        self._heap: list = []
+
+    def update(
+        self, business_id: int, working_hours: Optional[str], now: datetime.datetime
+    ) -> None:
+        schedule = _compile_working_hours(working_hours)
+        with self._lock:
+            self._raw[business_id] = working_hours
+            self._schedules[business_id] = schedule
+            if schedule is None:
+                self._flags.pop(business_id, None)
+                self._transitions.pop(business_id, None)
+                return
+            self._refresh(business_id, schedule, now)
+
+    def _refresh(self, business_id: int, schedule: tuple, now: datetime.datetime) -> None:
+        transition = _schedule_next_transition(schedule, now)
+        self._flags[business_id] = _schedule_is_open(schedule, now)
+        self._transitions[business_id] = transition
+        heapq.heappush(self._heap, (transition, business_id))
+
+    def _advance(self, now: datetime.datetime) -> None:
+        while self._heap and self._heap[0][0] <= now:
+            transition, business_id = heapq.heappop(self._heap)
+            if self._transitions.get(business_id) != transition:
+                continue  # takvim bu arada degismis, eski kayit
+            self._refresh(business_id, self._schedules[business_id], now)
+
+    def schedule_open(
+        self, business_id: int, working_hours: Optional[str], now: datetime.datetime
+    ) -> Optional[bool]:
+        with self._lock:
+            self._advance(now)
+            if business_id in self._raw and self._raw[business_id] == working_hours:
+                if self._schedules[business_id] is None:
+                    return None
+                return self._flags[business_id]
+        # Baska bir worker'da degismis ya da henuz yuklenmemis takvim
+        self.update(business_id, working_hours, now)
+        with self._lock:
+            return self._flags.get(business_id)
+
+    def next_transition(self, business_id: int) -> Optional[datetime.datetime]:
+        with self._lock:
+            return self._transitions.get(business_id)
+
+    def opens_within(
+        self,
+        business_id: int,
+        working_hours: Optional[str],
+        now: datetime.datetime,
+        minutes: int,
+    ) -> bool:
+        if self.schedule_open(business_id, working_hours, now) is not False:
+            return False
+        with self._lock:
+            schedule = self._schedules[business_id]
+        deadline = now + datetime.timedelta(minutes=minutes)
+        moment = now
+        while moment <= deadline:
+            moment = _schedule_next_transition(schedule, moment)
+            if moment <= deadline and _schedule_is_open(schedule, moment):
+                return True
+        return False
+
+
+working_hours_index = WorkingHoursIndex()
+
+
+def _load_working_hours_index():
+    db = SessionLocal()
+    try:
+        now = _turkey_now()
+        rows = (
+            db.query(BusinessDB.id, BusinessDB.working_hours)
+            .filter(BusinessDB.working_hours.isnot(None))
+            .all()
+        )
+        for business_id, working_hours in rows:
+            working_hours_index.update(business_id, working_hours, now)
+    finally:
+        db.close()
+
+
+_load_working_hours_index()
+
+
 def _attach_business_open_status(businesses: List[BusinessDB]) -> None:
     if not businesses:
         return
     now = _turkey_now()
     for biz in businesses:
         manual_open = True if biz.is_open is None else bool(biz.is_open)
-        schedule_open = _is_within_working_hours(biz.working_hours, now)
+        schedule_open = working_hours_index.schedule_open(
+            biz.id, biz.working_hours, now
+        )
         if schedule_open is None:
             biz.is_open = manual_open
         else:
             biz.is_open = manual_open and schedule_open
 
 
+# --- Canli siparis olaylari (in-process pub/sub) ---
+# Her kanal (isletme emaili / musteri emaili) son olaylari bir halka tamponda
+# tutar; yeniden baglanan istemci Last-Event-ID ile kacirdiklarini alir.
+# Hub process icidir: birden fazla worker ile calisirken her worker kendi
+# abonelerine yayin yapar.
+ORDER_EVENT_BUFFER_SIZE = int(os.environ.get("EATY_ORDER_EVENT_BUFFER", "200"))
+ORDER_EVENT_QUEUE_SIZE = 100
+ORDER_EVENT_KEEPALIVE_SECONDS = 15.0
+# Bu sure boyunca yayin almayan kanallarin tamponu silinir; kanal sayisi da
+# ust sinirla tutulur (en uzun suredir sessiz olan once gider)
+ORDER_EVENT_CHANNEL_TTL_SECONDS = float(os.environ.get("EATY_ORDER_EVENT_CHANNEL_TTL", "3600"))
+ORDER_EVENT_MAX_CHANNELS = int(os.environ.get("EATY_ORDER_EVENT_MAX_CHANNELS", "10000"))
+
+
+class OrderEventHub:
+    # Event id'leri "<acilis epoch'u>-<sira>" bicimindedir; sira process
+    # yeniden baslayinca 1'den baslar, epoch farkli oldugu icin eski bir
+    # Last-Event-ID ile gelen istemciye backlog yerine "resync" gonderilir.
+    def __init__(self, buffer_size: int, channel_ttl: float, max_channels: int):
+        self._lock = threading.Lock()
+        self._epoch = str(int(time.time() * 1000))
+        self._next_seq = 1
+        self._buffer_size = buffer_size
+        self._channel_ttl = channel_ttl
+        self._max_channels = max_channels
+        # kanal -> deque[(sira, tip, veri)]; en eski yayin alan kanal basta
+        self._buffers: collections.OrderedDict = collections.OrderedDict()
+        self._last_publish: dict = {}
+        self._evicted_upto: dict = {}
+        # silinen kanallarin son sirasi; tamponu olmayan kanala devam eden
+        # istemci bundan eskiyse kacirmis olabilir
+        self._pruned_upto = 0
+        self._subscribers: dict = collections.defaultdict(set)
+
+    def event_id(self, seq: int) -> str:
+        return f"{self._epoch}-{seq}"
+
+    def _parse_event_id(self, value: str) -> Optional[int]:
+        epoch, _, seq = value.strip().partition("-")
+        if epoch != self._epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def publish(self, channel: tuple, event_type: str, data: dict) -> None:
+        now = time.monotonic()
+        with self._lock:
+            message = (self._next_seq, event_type, data)
+            self._next_seq += 1
+            buffer = self._buffers.get(channel)
+            if buffer is None:
+                buffer = self._buffers[channel] = collections.deque(maxlen=self._buffer_size)
+            else:
+                self._buffers.move_to_end(channel)
+            if len(buffer) == buffer.maxlen:
+                self._evicted_upto[channel] = buffer[0][0]
+            buffer.append(message)
+            self._last_publish[channel] = now
+            self._prune(now)
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._deliver, queue, message)
+
+    def _prune(self, now: float) -> None:
+        while self._buffers:
+            channel = next(iter(self._buffers))
+            if (
+                len(self._buffers) <= self._max_channels
+                and now - self._last_publish[channel] < self._channel_ttl
+            ):
+                break
+            buffer = self._buffers.pop(channel)
+            del self._last_publish[channel]
+            self._evicted_upto.pop(channel, None)
+            self._pruned_upto = max(self._pruned_upto, buffer[-1][0])
+
+    @staticmethod
+    def _deliver(queue: asyncio.Queue, message) -> None:
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Yavas abone: akisi kapat, istemci Last-Event-ID ile devam eder
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    def subscribe(self, channel: tuple, last_event_id: Optional[str]):
+        queue: asyncio.Queue = asyncio.Queue(maxsize=ORDER_EVENT_QUEUE_SIZE)
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+            if last_event_id is None:
+                return subscriber, [], False
+            seq = self._parse_event_id(last_event_id)
+            if seq is None or seq >= self._next_seq:
+                # baska bir process'in (ya da gecersiz) id'si
+                return subscriber, [], True
+            buffer = self._buffers.get(channel)
+            if buffer is None:
+                return subscriber, [], seq < self._pruned_upto
+            backlog = [message for message in buffer if message[0] > seq]
+            missed = self._evicted_upto.get(channel, 0) > seq
+        return subscriber, backlog, missed
+
+    def unsubscribe(self, channel: tuple, subscriber) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+
+order_events = OrderEventHub(
+    ORDER_EVENT_BUFFER_SIZE, ORDER_EVENT_CHANNEL_TTL_SECONDS, ORDER_EVENT_MAX_CHANNELS
+)
+
+
+def _format_sse(event_id: Optional[str], event_type: str, data: dict) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, default=str, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def _order_event_stream(
+    request: Request, channel: tuple, last_event_id: Optional[str]
+):
+    subscriber, backlog, missed = order_events.subscribe(channel, last_event_id)
+    queue = subscriber[1]
+    try:
+        if missed:
+            # Tampon tasmis ya da sunucu yeniden baslamis: istemci listeyi
+            # bastan cekmeli
+            yield _format_sse(None, "resync", {})
+        for seq, event_type, data in backlog:
+            yield _format_sse(order_events.event_id(seq), event_type, data)
+        while not await request.is_disconnected():
+            try:
+                message = await asyncio.wait_for(
+                    queue.get(), timeout=ORDER_EVENT_KEEPALIVE_SECONDS
+                )
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if message is None:
+                break
+            seq, event_type, data = message
+            yield _format_sse(order_events.event_id(seq), event_type, data)
+    finally:
+        order_events.unsubscribe(channel, subscriber)
+
+
+def _order_to_board_item(order: OrderDB) -> dict:
+    return {
+        "id": order.id,
+        "customer_name": order.customer_name,
+        "customer_phone": order.customer_phone,
+        "customer_address": order.customer_address,
+        "customer_note": order.customer_note,
+        "total_price": order.total_price,
+        "status": order.status,
+        "rejection_reason": order.rejection_reason,
+        "created_at": order.created_at.isoformat(),
+        "items": [
+            {"product_name": i.product_name, "quantity": i.quantity, "price": i.price}
+            for i in order.items
+        ],
+    }
+
+
+def _publish_order_event(
+    event_type: str, order: OrderDB, business_email: Optional[str]
+) -> None:
+    status_data = {
+        "id": order.id,
+        "business_id": order.business_id,
+        "status": order.status,
+        "rejection_reason": order.rejection_reason,
+    }
+    if business_email:
+        business_data = (
+            _order_to_board_item(order) if event_type == "order_created" else status_data
+        )
+        order_events.publish(("business", business_email), event_type, business_data)
+    if order.customer_email:
+        order_events.publish(("customer", order.customer_email), event_type, status_data)
+
+
+def _parse_last_event_id(header_value: Optional[str], query_value: Optional[str]) -> Optional[str]:
+    if query_value:
+        return query_value
+    return header_value or None
+
+
 
 # 1) İşletme Kaydı (Google veya Email/Şifre)
 @app.post("/register/business")
@@ -897,7 +2647,7 @@ def register_business(business: BusinessRegister, db: Session = Depends(get_db))
     normalized_email = business.email.strip().lower()
     db_biz = (
         db.query(BusinessDB)
-        .filter(func.lower(BusinessDB.email) == normalized_email)
+        .filter(BusinessDB.email == normalized_email)
         .first()
     )
     if db_biz:
@@ -954,18 +2704,22 @@ def register_business(business: BusinessRegister, db: Session = Depends(get_db))
         password_hash=pw_hash,
     )
     db.add(new_biz)
+    db.flush()
+    _sync_business_geo_cells(db, new_biz)
     db.commit()
+    _invalidate_business_directory(new_biz.category)
+    working_hours_index.update(new_biz.id, new_biz.working_hours, _turkey_now())
     db.refresh(new_biz)
     return {"message": "Business registered", "id": new_biz.id}
 
 
 # 2) İşletme Email/Şifre Giriş (Panel)
-@app.post("/auth/business/login", response_model=BusinessProfile)
+@app.post("/auth/business/login", response_model=BusinessLoginOut)
 def business_login(payload: BusinessLogin, db: Session = Depends(get_db)):
     normalized_email = payload.email.strip().lower()
     biz = (
         db.query(BusinessDB)
-        .filter(func.lower(BusinessDB.email) == normalized_email)
+        .filter(BusinessDB.email == normalized_email)
         .first()
     )
     if not biz:
@@ -974,11 +2728,35 @@ def business_login(payload: BusinessLogin, db: Session = Depends(get_db)):
     if not biz.password_hash:
         raise HTTPException(status_code=400, detail="This business has no password login (use Google)")
 
-    if not _verify_password(payload.password.strip(), biz.password_hash):
+    password = payload.password.strip()
+    if not _verify_password(password, biz.password_hash):
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    if _password_needs_rehash(biz.password_hash):
+        biz.password_hash = _hash_password(password)
+        db.commit()
 
     _attach_business_open_status([biz])
-    return biz
+    profile = BusinessProfile.model_validate(biz)
+    return BusinessLoginOut(
+        **profile.model_dump(),
+        **_issue_business_tokens(biz.id, biz.email, biz.token_version or 0),
+    )
+
+
+@app.post("/auth/business/refresh", response_model=BusinessTokenOut)
+@_db_endpoint
+def refresh_business_token(payload: BusinessTokenRefresh, db: Session = Depends(get_db)):
+    claims = _verify_token(payload.refresh_token.strip(), "refresh")
+    if claims is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+    biz = db.get(BusinessDB, claims.get("sub"))
+    if (
+        not biz
+        or biz.email != claims.get("email")
+        or (biz.token_version or 0) != claims.get("ver", 0)
+    ):
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+    return _issue_business_tokens(biz.id, biz.email, biz.token_version or 0)
 
 
 # Dev-only: reset password for local testing
@@ -987,7 +2765,7 @@ def reset_business_password(payload: BusinessPasswordReset, db: Session = Depend
     normalized_email = payload.email.strip().lower()
     biz = (
         db.query(BusinessDB)
-        .filter(func.lower(BusinessDB.email) == normalized_email)
+        .filter(BusinessDB.email == normalized_email)
         .first()
     )
     if not biz:
@@ -998,17 +2776,19 @@ def reset_business_password(payload: BusinessPasswordReset, db: Session = Depend
         raise HTTPException(status_code=400, detail="Password must be at least 6 characters")
 
     biz.password_hash = _hash_password(password)
+    biz.token_version = (biz.token_version or 0) + 1
     db.commit()
     return {"message": "Password updated"}
 
 
 # 3) İşletme Bilgisi
 @app.get("/business/{email}", response_model=BusinessProfile)
+@_db_endpoint
 def get_business(email: str, db: Session = Depends(get_db)):
     normalized_email = email.strip().lower()
     biz = (
         db.query(BusinessDB)
-        .filter(func.lower(BusinessDB.email) == normalized_email)
+        .filter(BusinessDB.email == normalized_email)
         .first()
     )
     if not biz:
@@ -1020,17 +2800,22 @@ def get_business(email: str, db: Session = Depends(get_db)):
 
 # 3b) İşletme Profilini Güncelle
 @app.put("/business/{email}/profile", response_model=BusinessProfile)
+@_db_endpoint
 def update_business_profile(
-    email: str, payload: BusinessProfileUpdate, db: Session = Depends(get_db)
+    email: str,
+    payload: BusinessProfileUpdate,
+    db: Session = Depends(get_db),
+    claims: Optional[dict] = Depends(get_business_claims),
 ):
     normalized_email = email.strip().lower()
     biz = (
         db.query(BusinessDB)
-        .filter(func.lower(BusinessDB.email) == normalized_email)
+        .filter(BusinessDB.email == normalized_email)
         .first()
     )
     if not biz:
         raise HTTPException(status_code=404, detail="Business not found")
+    _authorize_business(claims, biz.id)
 
     if payload.address is not None:
         biz.address = payload.address
@@ -1050,8 +2835,16 @@ def update_business_profile(
         biz.longitude = payload.longitude
     if payload.working_hours is not None:
         biz.working_hours = payload.working_hours
+    if (
+        payload.delivery_radius_km is not None
+        or payload.latitude is not None
+        or payload.longitude is not None
+    ):
+        _sync_business_geo_cells(db, biz)
 
     db.commit()
+    _invalidate_business_directory(biz.category)
+    working_hours_index.update(biz.id, biz.working_hours, _turkey_now())
     db.refresh(biz)
     _attach_business_open_status([biz])
     return biz
@@ -1059,6 +2852,7 @@ def update_business_profile(
 
 # 3c) Customer profile (name/phone)
 @app.get("/customers/{email}/profile", response_model=CustomerProfileOut)
+@_db_endpoint
 def get_customer_profile(email: str, db: Session = Depends(get_db)):
     normalized_email = email.strip().lower()
     if not normalized_email:
@@ -1066,7 +2860,7 @@ def get_customer_profile(email: str, db: Session = Depends(get_db)):
 
     profile = (
         db.query(CustomerProfileDB)
-        .filter(func.lower(CustomerProfileDB.email) == normalized_email)
+        .filter(CustomerProfileDB.email == normalized_email)
         .first()
     )
     if not profile:
@@ -1075,6 +2869,7 @@ def get_customer_profile(email: str, db: Session = Depends(get_db)):
 
 
 @app.put("/customers/{email}/profile", response_model=CustomerProfileOut)
+@_db_endpoint
 def update_customer_profile(
     email: str, payload: CustomerProfileUpdate, db: Session = Depends(get_db)
 ):
@@ -1087,7 +2882,7 @@ def update_customer_profile(
 
     profile = (
         db.query(CustomerProfileDB)
-        .filter(func.lower(CustomerProfileDB.email) == normalized_email)
+        .filter(CustomerProfileDB.email == normalized_email)
         .first()
     )
     if profile is None:
@@ -1109,6 +2904,7 @@ def update_customer_profile(
 
 # 3d) Customer addresses
 @app.get("/customers/{email}/addresses", response_model=List[CustomerAddressOut])
+@_db_endpoint
 def get_customer_addresses(email: str, db: Session = Depends(get_db)):
     normalized_email = email.strip().lower()
     if not normalized_email:
@@ -1116,7 +2912,7 @@ def get_customer_addresses(email: str, db: Session = Depends(get_db)):
 
     rows = (
         db.query(CustomerAddressDB)
-        .filter(func.lower(CustomerAddressDB.email) == normalized_email)
+        .filter(CustomerAddressDB.email == normalized_email)
         .order_by(CustomerAddressDB.sequence.asc())
         .all()
     )
@@ -1124,6 +2920,7 @@ def get_customer_addresses(email: str, db: Session = Depends(get_db)):
 
 
 @app.put("/customers/{email}/addresses", response_model=List[CustomerAddressOut])
+@_db_endpoint
 def replace_customer_addresses(
     email: str, payload: List[CustomerAddressIn], db: Session = Depends(get_db)
 ):
@@ -1132,7 +2929,7 @@ def replace_customer_addresses(
         raise HTTPException(status_code=400, detail="Email is required")
 
     db.query(CustomerAddressDB).filter(
-        func.lower(CustomerAddressDB.email) == normalized_email
+        CustomerAddressDB.email == normalized_email
     ).delete()
 
     rows: List[CustomerAddressDB] = []
@@ -1162,40 +2959,714 @@ def replace_customer_addresses(
 
 
 # 4) Kategori Bazlı İşletmeler
-@app.get("/businesses/{category}", response_model=List[BusinessPublic])
-def get_businesses_by_category(category: str, db: Session = Depends(get_db)):
-    if category not in ("food", "market"):
-        raise HTTPException(status_code=400, detail="Invalid category")
+# Kategori listesi serialize edilmis haliyle ve ETag'iyle bellekte tutulur.
+# Kayit/profil/durum/yorum degisiklikleri ilgili kategoriyi hemen dusurur;
+# TTL ayrica bir sonraki acilis/kapanis anini gecmez ki is_open bayatlamasin.
+BUSINESS_DIRECTORY_CACHE_TTL = float(os.environ.get("EATY_BUSINESS_CACHE_TTL", "300"))
+
+_business_directory_cache: dict = {}
+_business_directory_versions: dict = collections.defaultdict(int)
+_business_directory_lock = threading.Lock()
+
+
+def _invalidate_business_directory(category: Optional[str]) -> None:
+    with _business_directory_lock:
+        _business_directory_versions[category] += 1
+        _business_directory_cache.pop(category, None)
+
+
+def _build_business_directory(db: Session, category: str) -> tuple[bytes, str, float]:
     businesses = (
         db.query(BusinessDB).filter(BusinessDB.category == category).all()
     )
     _attach_business_ratings(db, businesses)
     _attach_business_open_status(businesses)
+    body = json.dumps(
+        [BusinessPublic.model_validate(biz).model_dump(mode="json") for biz in businesses],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+    now = _turkey_now()
+    ttl = BUSINESS_DIRECTORY_CACHE_TTL
+    for biz in businesses:
+        transition = working_hours_index.next_transition(biz.id)
+        if transition is not None:
+            ttl = min(ttl, (transition - now).total_seconds())
+    return body, etag, time.monotonic() + max(ttl, 0.0)
+
+
+@app.get("/businesses/{category}", response_model=List[BusinessPublic])
+@_db_endpoint
+def get_businesses_by_category(
+    category: str,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    if category not in ("food", "market"):
+        raise HTTPException(status_code=400, detail="Invalid category")
+    with _business_directory_lock:
+        entry = _business_directory_cache.get(category)
+        version = _business_directory_versions[category]
+    if entry is None or entry[2] <= time.monotonic():
+        entry = _build_business_directory(db, category)
+        with _business_directory_lock:
+            # Hesaplama sirasinda invalidation olduysa bayat sonucu saklama
+            if _business_directory_versions[category] == version:
+                _business_directory_cache[category] = entry
+    body, etag, _ = entry
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# 4a) Yakında Açılacak İşletmeler
+@app.get("/businesses/{category}/opening-soon", response_model=List[BusinessPublic])
+@_db_endpoint
+def get_businesses_opening_soon(
+    category: str,
+    within_minutes: int = 60,
+    db: Session = Depends(get_db),
+):
+    if category not in ("food", "market"):
+        raise HTTPException(status_code=400, detail="Invalid category")
+    within_minutes = max(1, min(within_minutes, 24 * 60))
+    now = _turkey_now()
+    businesses = [
+        biz
+        for biz in db.query(BusinessDB)
+        .filter(
+            BusinessDB.category == category,
+            BusinessDB.working_hours.isnot(None),
+            or_(BusinessDB.is_open.is_(None), BusinessDB.is_open.is_(True)),
+        )
+        .all()
+        if working_hours_index.opens_within(
+            biz.id, biz.working_hours, now, within_minutes
+        )
+    ]
+    _attach_business_ratings(db, businesses)
+    _attach_business_open_status(businesses)
     return businesses
 
 
+# 4b) Konuma Göre İşletmeler (teslimat alanı müşteriyi kapsayanlar)
+_NEARBY_RATING_PRIOR = 4.0
+_NEARBY_RATING_PRIOR_WEIGHT = 5
+
+
+def _nearby_score(biz: BusinessDB) -> float:
+    # Yakinlik (0..1) ile az yorumda 4.0'a cekilen puan (0..1) esit agirlikli
+    proximity = 1.0 - min(biz.distance_km / _delivery_radius_km(biz), 1.0)
+    count = biz.rating_count or 0
+    rating = (
+        (biz.rating_avg or 0) * count
+        + _NEARBY_RATING_PRIOR * _NEARBY_RATING_PRIOR_WEIGHT
+    ) / (count + _NEARBY_RATING_PRIOR_WEIGHT)
+    return 0.5 * proximity + 0.5 * (rating / 5.0)
+
+
+@app.get("/businesses/{category}/nearby", response_model=List[BusinessNearby])
+@_db_endpoint
+def get_nearby_businesses(
+    category: str,
+    lat: float,
+    lon: float,
+    sort: str = "distance",
+    limit: int = 50,
+    offset: int = 0,
+    db: Session = Depends(get_db),
+):
+    if category not in ("food", "market"):
+        raise HTTPException(status_code=400, detail="Invalid category")
+    if sort not in ("distance", "score"):
+        raise HTTPException(status_code=400, detail="Invalid sort (distance/score)")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise HTTPException(status_code=400, detail="Invalid coordinates")
+    limit = max(1, min(limit, 100))
+    offset = max(0, offset)
+
+    candidates = (
+        db.query(BusinessDB)
+        .join(BusinessGeoCellDB, BusinessGeoCellDB.business_id == BusinessDB.id)
+        .filter(
+            BusinessGeoCellDB.cell_key == _geo_cell_key(lat, lon),
+            BusinessDB.category == category,
+        )
+        .all()
+    )
+    businesses = []
+    for biz in candidates:
+        distance = _distance_km(lat, lon, biz.latitude, biz.longitude)
+        if distance <= _delivery_radius_km(biz):
+            biz.distance_km = distance
+            businesses.append(biz)
+
+    if sort == "score":
+        _attach_business_ratings(db, businesses)
+        businesses.sort(key=lambda biz: (-_nearby_score(biz), biz.distance_km))
+        page = businesses[offset : offset + limit]
+    else:
+        businesses.sort(key=lambda biz: biz.distance_km)
+        page = businesses[offset : offset + limit]
+        _attach_business_ratings(db, page)
+    _attach_business_open_status(page)
+    return page
+
+
 # 5) Ürün Ekle
 @app.post("/business/{email}/products")
-def add_product(email: str, product: ProductCreate, db: Session = Depends(get_db)):
-    biz = db.query(BusinessDB).filter(BusinessDB.email == email).first()
+@_db_endpoint
+def add_product(
+    email: str,
+    product: ProductCreate,
+    db: Session = Depends(get_db),
+    claims: Optional[dict] = Depends(get_business_claims),
+):
+    biz = db.query(BusinessDB).filter(BusinessDB.email == email.strip().lower()).first()
     if not biz:
         raise HTTPException(status_code=404, detail="Business not found")
+    _authorize_business(claims, biz.id)
 
     new_product = ProductDB(**product.dict(), business_id=biz.id)
     db.add(new_product)
+    db.flush()
+    _index_product_for_search(db, new_product)
     db.commit()
     return {"message": "Product added"}
 
 
+# 5a) Toplu Ürün İçe Aktarma (JSON lines / CSV, harici SKU ile upsert)
+# Govde satir satir okunur ve PRODUCT_IMPORT_BATCH_SIZE'lik gruplar halinde
+# yazilir; bellekte yalnizca bir grup ve sinirli bir hata raporu tutulur.
+PRODUCT_IMPORT_BATCH_SIZE = 500
+PRODUCT_IMPORT_MAX_ERRORS = 1000
+PRODUCT_IMPORT_MAX_LINE_CHARS = 64 * 1024
+
+
+async def _run_in_db_session(fn, *args):
+    if ASYNC_DB:
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(lambda session: fn(session, *args))
+
+    def call():
+        db = SessionLocal()
+        try:
+            return fn(db, *args)
+        finally:
+            db.close()
+
+    return await run_in_threadpool(call)
+
+
+async def _iter_upload_lines(request: Request):
+    # PRODUCT_IMPORT_MAX_LINE_CHARS'i asan satir tamponlanmaz: yerine None
+    # uretilir ve satirin geri kalani bir sonraki satir sonuna kadar atlanir
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    skipping = False
+    async for chunk in request.stream():
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            if skipping:
+                skipping = False
+                continue
+            yield line.rstrip("\r") if len(line) <= PRODUCT_IMPORT_MAX_LINE_CHARS else None
+        if len(pending) > PRODUCT_IMPORT_MAX_LINE_CHARS:
+            if not skipping:
+                skipping = True
+                yield None
+            pending = ""
+    pending += decoder.decode(b"", final=True)
+    if pending and not skipping:
+        yield pending.rstrip("\r") if len(pending) <= PRODUCT_IMPORT_MAX_LINE_CHARS else None
+
+
+async def _iter_import_records(request: Request, fmt: str):
+    # (satir no, kayit ya da hata mesaji) uretir
+    if fmt == "jsonl":
+        row = 0
+        async for line in _iter_upload_lines(request):
+            row += 1
+            if line is None:
+                yield row, "Line too long"
+                continue
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield row, "Invalid JSON"
+                continue
+            yield row, record if isinstance(record, dict) else "Expected a JSON object"
+        return
+
+    header = None
+    buffered = ""
+    row = 0
+    async for line in _iter_upload_lines(request):
+        if line is None or len(buffered) + len(line) > PRODUCT_IMPORT_MAX_LINE_CHARS:
+            if buffered or header is None:
+                # tirnak icindeyken ya da baslikta: kalan satirlar cozulemez
+                yield row + 1, "Record too long"
+                return
+            row += 1
+            yield row, "Record too long"
+            continue
+        # Tirnak icindeki satir sonlari: tirnak sayisi tek kaldikca birlestir
+        buffered = f"{buffered}\n{line}" if buffered else line
+        if buffered.count('"') % 2:
+            continue
+        values, buffered = next(csv.reader([buffered])), ""
+        if header is None:
+            header = [name.strip().lower() for name in values]
+            continue
+        row += 1
+        if not any(value.strip() for value in values):
+            continue
+        if len(values) != len(header):
+            yield row, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        # Bos hucre alanin varsayilanini kullanir (is_available=True gibi)
+        yield row, {
+            name: value.strip() for name, value in zip(header, values) if value.strip()
+        }
+    if buffered:
+        yield row + 1, "Unterminated quoted field"
+
+
+def _find_import_business(db: Session, email: str) -> Optional[int]:
+    biz = db.query(BusinessDB.id).filter(BusinessDB.email == email).first()
+    return biz[0] if biz else None
+
+
+def _upsert_product_batch(
+    db: Session, business_id: int, batch: List[ProductImportRow]
+) -> tuple[int, int]:
+    rows = {item.sku: item for item in batch}
+    existing = dict(
+        db.query(ProductDB.external_sku, ProductDB.id)
+        .filter(
+            ProductDB.business_id == business_id,
+            ProductDB.external_sku.in_(list(rows)),
+        )
+        .all()
+    )
+    table = ProductDB.__table__
+    fields = ("name", "description", "price", "category", "image_url", "is_available")
+    if not PRODUCT_FTS_ENABLED:
+        fields += ("search_text",)
+
+    def values(item: ProductImportRow) -> dict:
+        data = item.model_dump(include=set(fields))
+        if not PRODUCT_FTS_ENABLED:
+            data["search_text"] = _product_search_text(
+                item.name, item.description, item.category
+            )
+        return data
+
+    updates = [
+        {"_id": existing[sku], **values(item)}
+        for sku, item in rows.items()
+        if sku in existing
+    ]
+    if updates:
+        db.execute(
+            table.update()
+            .where(table.c.id == bindparam("_id"))
+            .values({field: bindparam(field) for field in fields}),
+            updates,
+        )
+    new_skus = [sku for sku in rows if sku not in existing]
+    if new_skus:
+        next_sequence = (
+            db.query(func.max(ProductDB.sequence))
+            .filter(ProductDB.business_id == business_id)
+            .scalar()
+            or 0
+        ) + 1
+        db.execute(
+            table.insert(),
+            [
+                {
+                    **values(rows[sku]),
+                    "business_id": business_id,
+                    "external_sku": sku,
+                    "sequence": next_sequence + offset,
+                }
+                for offset, sku in enumerate(new_skus)
+            ],
+        )
+    if PRODUCT_FTS_ENABLED:
+        ids = dict(
+            db.query(ProductDB.external_sku, ProductDB.id).filter(
+                ProductDB.business_id == business_id,
+                ProductDB.external_sku.in_(list(rows)),
+            )
+        )
+        db.execute(
+            text("DELETE FROM products_fts WHERE rowid = :id"),
+            [{"id": ids[sku]} for sku in rows],
+        )
+        db.execute(
+            text(
+                "INSERT INTO products_fts (rowid, name, description, category) "
+                "VALUES (:id, :name, :description, :category)"
+            ),
+            [
+                {
+                    "id": ids[sku],
+                    "name": _fold_search_text(item.name),
+                    "description": _fold_search_text(item.description),
+                    "category": _fold_search_text(item.category),
+                }
+                for sku, item in rows.items()
+            ],
+        )
+    db.commit()
+    return len(new_skus), len(updates)
+
+
+@app.post("/business/{email}/products/import", response_model=ProductImportReport)
+async def import_products(
+    email: str,
+    request: Request,
+    format: Optional[str] = None,
+    claims: Optional[dict] = Depends(get_business_claims),
+):
+    fmt = format or (
+        "csv" if "csv" in request.headers.get("content-type", "") else "jsonl"
+    )
+    if fmt not in ("jsonl", "csv"):
+        raise HTTPException(status_code=400, detail="Invalid format (jsonl/csv)")
+    business_id = await _run_in_db_session(_find_import_business, email.strip().lower())
+    if business_id is None:
+        raise HTTPException(status_code=404, detail="Business not found")
+    _authorize_business(claims, business_id)
+
+    report = ProductImportReport(processed=0, created=0, updated=0, failed=0, errors=[])
+
+    def fail(row: int, sku: Optional[str], error: str) -> None:
+        report.failed += 1
+        if len(report.errors) < PRODUCT_IMPORT_MAX_ERRORS:
+            report.errors.append(ProductImportError(row=row, sku=sku, error=error))
+        else:
+            report.errors_truncated = True
+
+    # Ayni SKU bir parti icinde tekrar ederse son satir gecerlidir; onceki
+    # satirlar "duplicates" olarak sayilir. Bellek SKU sayisiyla buyumesin diye
+    # yalnizca parti icine bakilir: baska partide tekrar eden SKU ikinci
+    # yazimda "updated" sayilir. Her satir tam bir sayaca girer:
+    # processed = created + updated + duplicates + failed
+    async def flush(batch: dict) -> None:
+        try:
+            created, updated = await _run_in_db_session(
+                _upsert_product_batch, business_id, [item for _, item in batch.values()]
+            )
+        except Exception as exc:
+            for row, item in batch.values():
+                fail(row, item.sku, f"Batch failed: {type(exc).__name__}")
+            return
+        report.created += created
+        report.updated += updated
+
+    batch: dict = {}  # sku -> (satir no, kayit)
+    async for row, record in _iter_import_records(request, fmt):
+        report.processed += 1
+        if isinstance(record, str):
+            fail(row, None, record)
+            continue
+        if "sku" not in record and "external_sku" in record:
+            record["sku"] = record.pop("external_sku")
+        try:
+            item = ProductImportRow.model_validate(record)
+        except ValidationError as exc:
+            error = exc.errors()[0]
+            location = ".".join(str(part) for part in error["loc"])
+            fail(row, str(record.get("sku") or "") or None, f"{location}: {error['msg']}")
+            continue
+        item.sku = item.sku.strip()
+        if not item.sku or not item.name.strip():
+            fail(row, item.sku or None, "SKU and name are required")
+            continue
+        if item.sku in batch:
+            report.duplicates += 1
+        batch[item.sku] = (row, item)
+        if len(batch) >= PRODUCT_IMPORT_BATCH_SIZE:
+            await flush(batch)
+            batch = {}
+    if batch:
+        await flush(batch)
+    return report
+
+
 # 6) Menü Listele
 @app.get("/business/{id}/menu")
+@_db_endpoint
 def get_menu(id: int, db: Session = Depends(get_db)):
-    return db.query(ProductDB).filter(ProductDB.business_id == id).order_by(ProductDB.sequence.asc()).all()
+    return (
+        db.query(ProductDB)
+        .filter(ProductDB.business_id == id)
+        .order_by(ProductDB.sequence.asc(), ProductDB.id.asc())
+        .all()
+    )
+
+
+# 6a) Ürün Arama (kategorideki açık işletmeler genelinde)
+@app.get("/products/search", response_model=List[ProductSearchGroup])
+@_db_endpoint
+def search_products(
+    q: str,
+    category: str,
+    per_business: int = 5,
+    limit: int = 20,
+    offset: int = 0,
+    db: Session = Depends(get_db),
+):
+    if category not in ("food", "market"):
+        raise HTTPException(status_code=400, detail="Invalid category")
+    per_business = max(1, min(per_business, 20))
+    limit = max(1, min(limit, 50))
+    offset = max(0, offset)
+    terms = [term for term in re.split(r"\W+", _fold_search_text(q)) if term]
+    if not terms:
+        raise HTTPException(status_code=400, detail="Search query is required")
+
+    # Isabetler (urun, isletme, skor) olarak alinir; skor kucukse daha iyi
+    if PRODUCT_FTS_ENABLED:
+        match = " ".join(f'"{term}"*' for term in terms)
+        hits = (
+            text(
+                "SELECT p.id AS product_id, p.business_id AS business_id, "
+                "bm25(products_fts, 10.0, 2.0, 4.0) AS score "
+                "FROM products_fts "
+                "JOIN products p ON p.id = products_fts.rowid "
+                "JOIN businesses b ON b.id = p.business_id "
+                "WHERE products_fts MATCH :match AND b.category = :category "
+                "AND (p.is_available IS NULL OR p.is_available = 1) "
+                "AND (b.is_open IS NULL OR b.is_open = 1)"
+            )
+            .bindparams(match=match, category=category)
+            .columns(product_id=Integer, business_id=Integer, score=Float)
+            .subquery("hits")
+        )
+    else:
+        query = (
+            select(
+                ProductDB.id.label("product_id"),
+                ProductDB.business_id.label("business_id"),
+                literal(0.0).label("score"),
+            )
+            .join(BusinessDB, BusinessDB.id == ProductDB.business_id)
+            .where(
+                BusinessDB.category == category,
+                or_(ProductDB.is_available.is_(None), ProductDB.is_available.is_(True)),
+                or_(BusinessDB.is_open.is_(None), BusinessDB.is_open.is_(True)),
+            )
+        )
+        for term in terms:
+            query = query.where(ProductDB.search_text.like(f"%{term}%"))
+        hits = query.subquery("hits")
+
+    # Siralama ve sinirlama SQL'de yapilir: her isletmenin urunleri skora gore
+    # numaralanir, isletmeler en iyi eslesen urunlerine gore siralanir
+    ranked = select(
+        hits.c.product_id,
+        hits.c.business_id,
+        hits.c.score,
+        func.row_number()
+        .over(
+            partition_by=hits.c.business_id,
+            order_by=(hits.c.score, hits.c.product_id),
+        )
+        .label("rank"),
+    ).subquery("ranked")
+    leaders = (
+        select(ranked.c.business_id)
+        .where(ranked.c.rank == 1)
+        .order_by(ranked.c.score, ranked.c.product_id, ranked.c.business_id)
+    )
+    # Calisma saatine gore kapali isletmeler Python'da elenir; sayfa dolana
+    # kadar isletmeler offset + limit'lik parcalar halinde okunur
+    needed = offset + limit
+    open_businesses: List[BusinessDB] = []
+    scanned = 0
+    while len(open_businesses) < needed:
+        ids = [row[0] for row in db.execute(leaders.offset(scanned).limit(needed))]
+        if not ids:
+            break
+        scanned += len(ids)
+        by_id = {
+            biz.id: biz
+            for biz in db.query(BusinessDB).filter(BusinessDB.id.in_(ids)).all()
+        }
+        chunk = [by_id[business_id] for business_id in ids if business_id in by_id]
+        _attach_business_open_status(chunk)
+        open_businesses.extend(biz for biz in chunk if biz.is_open)
+        if len(ids) < needed:
+            break
+    page = open_businesses[offset : offset + limit]
+    if not page:
+        return []
+    _attach_business_ratings(db, page)
+
+    top_ids: dict = {biz.id: [] for biz in page}
+    for business_id, product_id in db.execute(
+        select(ranked.c.business_id, ranked.c.product_id)
+        .where(ranked.c.rank <= per_business, ranked.c.business_id.in_(list(top_ids)))
+        .order_by(ranked.c.business_id, ranked.c.rank)
+    ):
+        top_ids[business_id].append(product_id)
+    product_ids = [product_id for ids in top_ids.values() for product_id in ids]
+    products = {
+        product.id: product
+        for product in db.query(ProductDB).filter(ProductDB.id.in_(product_ids)).all()
+    }
+    return [
+        ProductSearchGroup(
+            business=BusinessPublic.model_validate(biz),
+            products=[
+                ProductOut.model_validate(products[product_id])
+                for product_id in top_ids[biz.id]
+                if product_id in products
+            ],
+        )
+        for biz in page
+    ]
 
 
 # 7) Sipariş Oluştur
+ORDER_IDEMPOTENCY_TTL = datetime.timedelta(
+    hours=float(os.environ.get("EATY_IDEMPOTENCY_TTL_HOURS", "24"))
+)
+ORDER_MAX_ITEM_QUANTITY = 99
+_idempotency_purge_lock = threading.Lock()
+_idempotency_purged_at = 0.0
+
+
+def _purge_expired_idempotency_keys(db: Session) -> None:
+    # Suresi dolan anahtarlar dakikada en fazla bir kez temizlenir
+    global _idempotency_purged_at
+    with _idempotency_purge_lock:
+        if time.monotonic() - _idempotency_purged_at < 60:
+            return
+        _idempotency_purged_at = time.monotonic()
+    db.query(OrderIdempotencyKeyDB).filter(
+        OrderIdempotencyKeyDB.expires_at < datetime.datetime.utcnow()
+    ).delete(synchronize_session=False)
+
+
+def _replay_idempotent_order(
+    db: Session, customer_email: str, key: str, request_hash: str
+) -> Optional[dict]:
+    record = (
+        db.query(OrderIdempotencyKeyDB)
+        .filter(
+            OrderIdempotencyKeyDB.customer_email == customer_email,
+            OrderIdempotencyKeyDB.key == key,
+            OrderIdempotencyKeyDB.expires_at > datetime.datetime.utcnow(),
+        )
+        .first()
+    )
+    if record is None:
+        return None
+    if record.request_hash != request_hash:
+        raise HTTPException(
+            status_code=422, detail="Idempotency key reused with a different order"
+        )
+    placed = db.get(OrderDB, record.order_id)
+    return {
+        "message": "Order placed",
+        "id": record.order_id,
+        "total_price": placed.total_price if placed else None,
+    }
+
+
+def _price_order_items(
+    db: Session, business_id: int, items: List[OrderItemCreate]
+) -> List[dict]:
+    ids = {item.product_id for item in items if item.product_id is not None}
+    names = {
+        (item.product_name or "").strip()
+        for item in items
+        if item.product_id is None
+    }
+    conditions = []
+    if ids:
+        conditions.append(ProductDB.id.in_(ids))
+    if names:
+        conditions.append(ProductDB.name.in_(names))
+    products = (
+        db.query(ProductDB)
+        .filter(ProductDB.business_id == business_id, or_(*conditions))
+        .all()
+    )
+    by_id = {product.id: product for product in products}
+    by_name = {product.name: product for product in products}
+
+    priced = []
+    for item in items:
+        if item.quantity < 1 or item.quantity > ORDER_MAX_ITEM_QUANTITY:
+            raise HTTPException(status_code=400, detail="Invalid item quantity")
+        if item.product_id is not None:
+            product = by_id.get(item.product_id)
+        else:
+            product = by_name.get((item.product_name or "").strip())
+        if product is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Product not found: {item.product_id or item.product_name}",
+            )
+        if product.is_available is False:
+            raise HTTPException(
+                status_code=400, detail=f"Product unavailable: {product.name}"
+            )
+        priced.append(
+            {
+                "product_name": product.name,
+                "quantity": item.quantity,
+                "price": product.price or 0,
+            }
+        )
+    return priced
+
+
 @app.post("/orders")
-def place_order(order: OrderCreate, db: Session = Depends(get_db)):
+@_db_endpoint
+def place_order(
+    order: OrderCreate,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    customer_email = order.customer_email.strip().lower()
+    key = (idempotency_key or "").strip()[:200] or None
+    request_hash = hashlib.sha256(order.model_dump_json().encode("utf-8")).hexdigest()
+    if key:
+        replay = _replay_idempotent_order(db, customer_email, key, request_hash)
+        if replay is not None:
+            return replay
+
+    if not order.items:
+        raise HTTPException(status_code=400, detail="Order has no items")
+    biz = db.get(BusinessDB, order.business_id)
+    if not biz:
+        raise HTTPException(status_code=404, detail="Business not found")
+    items = _price_order_items(db, biz.id, order.items)
+    total_price = round(sum(item["price"] * item["quantity"] for item in items), 2)
+    if order.total_price is not None and abs(order.total_price - total_price) > 0.01:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Prices changed, current total is {total_price:.2f}",
+        )
+    if biz.min_order_amount and total_price < biz.min_order_amount:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Minimum order amount is {biz.min_order_amount:.2f}",
+        )
+
     customer_name = order.customer_name.strip() if order.customer_name else None
     customer_phone = order.customer_phone.strip() if order.customer_phone else None
     customer_note = order.customer_note.strip() if order.customer_note else None
@@ -1206,63 +3677,123 @@ def place_order(order: OrderCreate, db: Session = Depends(get_db)):
     if customer_note == "":
         customer_note = None
     new_order = OrderDB(
-        business_id=order.business_id,
-        customer_email=order.customer_email,
+        business_id=biz.id,
+        customer_email=customer_email,
         customer_name=customer_name,
         customer_phone=customer_phone,
         customer_address=order.customer_address,
         customer_note=customer_note,
-        total_price=order.total_price,
+        total_price=total_price,
         status="Onay Bekliyor"
     )
+    # Siparis, kalemleri ve idempotency kaydi tek transaction'da yazilir
     db.add(new_order)
-    db.commit()
-    db.refresh(new_order)
-
-    for item in order.items:
-        db_item = OrderItemDB(**item.dict(), order_id=new_order.id)
-        db.add(db_item)
+    db.flush()
+    db.execute(
+        OrderItemDB.__table__.insert(),
+        [{**item, "order_id": new_order.id} for item in items],
+    )
+    _record_order_rollup(
+        db, biz.id, new_order.created_at, total_price, items, placed=1
+    )
+    if key:
+        _purge_expired_idempotency_keys(db)
+        db.query(OrderIdempotencyKeyDB).filter(
+            OrderIdempotencyKeyDB.customer_email == customer_email,
+            OrderIdempotencyKeyDB.key == key,
+            OrderIdempotencyKeyDB.expires_at <= datetime.datetime.utcnow(),
+        ).delete(synchronize_session=False)  # suresi dolmus eski kayit
+        db.add(
+            OrderIdempotencyKeyDB(
+                customer_email=customer_email,
+                key=key,
+                request_hash=request_hash,
+                order_id=new_order.id,
+                expires_at=datetime.datetime.utcnow() + ORDER_IDEMPOTENCY_TTL,
+            )
+        )
+    try:
+        db.commit()
+    except IntegrityError:
+        # Ayni anahtarla es zamanli gelen tekrar: ilk yazilan siparisi dondur
+        db.rollback()
+        replay = (
+            _replay_idempotent_order(db, customer_email, key, request_hash)
+            if key
+            else None
+        )
+        if replay is None:
+            raise
+        return replay
 
-    db.commit()
-    return {"message": "Order placed", "id": new_order.id}
+    _publish_order_event("order_created", new_order, biz.email)
+    return {"message": "Order placed", "id": new_order.id, "total_price": total_price}
 
 
 # 8) İşletme Siparişleri
+_ACTIVE_ORDER_STATUSES = ("Onay Bekliyor", "Hazırlanıyor", "Yolda")
+
+
 @app.get("/business/{email}/orders")
-def get_business_orders(email: str, db: Session = Depends(get_db)):
-    biz = db.query(BusinessDB).filter(BusinessDB.email == email).first()
+@_db_endpoint
+def get_business_orders(
+    email: str,
+    response: Response,
+    status: Optional[List[str]] = Query(None),
+    created_from: Optional[datetime.datetime] = None,
+    created_to: Optional[datetime.datetime] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    claims: Optional[dict] = Depends(get_business_claims),
+):
+    biz = db.query(BusinessDB).filter(BusinessDB.email == email.strip().lower()).first()
     if not biz:
         return []
-    orders = db.query(OrderDB).filter(OrderDB.business_id == biz.id).order_by(OrderDB.created_at.desc()).all()
-
-    result = []
-    for o in orders:
-        items = [{"product_name": i.product_name, "quantity": i.quantity, "price": i.price} for i in o.items]
-        result.append({
-            "id": o.id,
-            "customer_name": o.customer_name,
-            "customer_phone": o.customer_phone,
-            "customer_address": o.customer_address,
-            "customer_note": o.customer_note,
-            "total_price": o.total_price,
-            "status": o.status,
-            "rejection_reason": o.rejection_reason,
-            "created_at": o.created_at.isoformat(),
-            "items": items
-        })
-    return result
+    _authorize_business(claims, biz.id)
+    query = (
+        db.query(OrderDB)
+        .options(selectinload(OrderDB.items))
+        .filter(OrderDB.business_id == biz.id)
+        .order_by(OrderDB.created_at.desc(), OrderDB.id.desc())
+    )
+    if status:
+        # "active" kisayolu canli pano icin bekleyen/hazirlanan/yoldaki siparisler
+        statuses = set()
+        for value in status:
+            if value == "active":
+                statuses.update(_ACTIVE_ORDER_STATUSES)
+            else:
+                statuses.add(value)
+        query = query.filter(OrderDB.status.in_(statuses))
+    if created_from:
+        query = query.filter(OrderDB.created_at >= created_from)
+    if created_to:
+        query = query.filter(OrderDB.created_at < created_to)
+    orders = _fetch_created_page(query, OrderDB, response, limit, cursor)
+
+    return [_order_to_board_item(o) for o in orders]
 
 
 # 8b) Müşteri Siparişleri
 @app.get("/orders/customer/{email}", response_model=List[CustomerOrderOut])
-def get_customer_orders(email: str, db: Session = Depends(get_db)):
+@_db_endpoint
+def get_customer_orders(
+    email: str,
+    response: Response,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
     normalized_email = email.strip().lower()
-    orders = (
+    query = (
         db.query(OrderDB)
-        .filter(func.lower(OrderDB.customer_email) == normalized_email)
-        .order_by(OrderDB.created_at.desc())
-        .all()
+        .options(selectinload(OrderDB.items))
+        .filter(OrderDB.customer_email == normalized_email)
+        .order_by(OrderDB.created_at.desc(), OrderDB.id.desc())
     )
+    orders = _fetch_created_page(query, OrderDB, response, limit, cursor)
+
     order_ids = [order.id for order in orders]
     reviewed_ids = set()
     if order_ids:
@@ -1272,9 +3803,18 @@ def get_customer_orders(email: str, db: Session = Depends(get_db)):
             .all()
         )
         reviewed_ids = {row[0] for row in rows}
+    business_ids = {order.business_id for order in orders}
+    businesses_by_id = {}
+    if business_ids:
+        businesses_by_id = {
+            biz.id: biz
+            for biz in db.query(BusinessDB)
+            .filter(BusinessDB.id.in_(business_ids))
+            .all()
+        }
     result = []
     for order in orders:
-        biz = db.query(BusinessDB).filter(BusinessDB.id == order.business_id).first()
+        biz = businesses_by_id.get(order.business_id)
         items = [
             {
                 "product_name": item.product_name,
@@ -1303,8 +3843,47 @@ def get_customer_orders(email: str, db: Session = Depends(get_db)):
     return result
 
 
+# 8e) Canlı Sipariş Akışı (Server-Sent Events)
+@app.get("/business/{email}/orders/stream")
+async def stream_business_orders(
+    email: str,
+    request: Request,
+    last_event_id: Optional[str] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    claims: Optional[dict] = Depends(get_business_claims),
+):
+    normalized_email = email.strip().lower()
+    if claims is not None and claims.get("email") != normalized_email:
+        raise HTTPException(status_code=403, detail="Not allowed for this business")
+    resume_from = _parse_last_event_id(last_event_id_header, last_event_id)
+    return StreamingResponse(
+        _order_event_stream(request, ("business", normalized_email), resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/orders/customer/{email}/stream")
+async def stream_customer_orders(
+    email: str,
+    request: Request,
+    last_event_id: Optional[str] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    normalized_email = email.strip().lower()
+    if not normalized_email:
+        raise HTTPException(status_code=400, detail="Email is required")
+    resume_from = _parse_last_event_id(last_event_id_header, last_event_id)
+    return StreamingResponse(
+        _order_event_stream(request, ("customer", normalized_email), resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # 8c) Sipariş Değerlendirme
 @app.post("/orders/{order_id}/review", response_model=BusinessReviewOut)
+@_db_endpoint
 def create_order_review(
     order_id: int, payload: BusinessReviewCreate, db: Session = Depends(get_db)
 ):
@@ -1317,7 +3896,7 @@ def create_order_review(
         raise HTTPException(status_code=400, detail="Order not delivered")
 
     normalized_email = payload.customer_email.strip().lower()
-    if normalized_email != (order.customer_email or "").strip().lower():
+    if normalized_email != order.customer_email:
         raise HTTPException(status_code=403, detail="Not allowed to review")
 
     if not (1 <= payload.rating <= 5):
@@ -1361,13 +3940,20 @@ def create_order_review(
         comment=comment,
     )
     db.add(review)
+    _apply_review_to_rating_stats(db, order.business_id, speed, service, taste)
+    _record_review_rollup(
+        db, order.business_id, datetime.datetime.utcnow(), (speed + service + taste) / 3.0
+    )
     db.commit()
+    biz = db.get(BusinessDB, order.business_id)
+    _invalidate_business_directory(biz.category if biz else None)
     db.refresh(review)
     return review
 
 
 # 8d) İşletme Yorumları
 @app.get("/business/{business_id}/reviews", response_model=List[BusinessReviewOut])
+@_db_endpoint
 def get_business_reviews(
     business_id: int,
     limit: int = 100,
@@ -1386,10 +3972,17 @@ def get_business_reviews(
 
 # 9) Ürün Güncelleme
 @app.put("/products/{product_id}")
-def update_product(product_id: int, product: ProductCreate, db: Session = Depends(get_db)):
+@_db_endpoint
+def update_product(
+    product_id: int,
+    product: ProductCreate,
+    db: Session = Depends(get_db),
+    claims: Optional[dict] = Depends(get_business_claims),
+):
     db_product = db.query(ProductDB).filter(ProductDB.id == product_id).first()
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
+    _authorize_business(claims, db_product.business_id)
 
     db_product.name = product.name
     db_product.description = product.description
@@ -1398,6 +3991,7 @@ def update_product(product_id: int, product: ProductCreate, db: Session = Depend
     db_product.image_url = product.image_url
     db_product.is_available = product.is_available
 
+    _index_product_for_search(db, db_product)
     db.commit()
     db.refresh(db_product)
     return {"message": "Product updated"}
@@ -1405,56 +3999,1191 @@ def update_product(product_id: int, product: ProductCreate, db: Session = Depend
 
 # 10) Ürün Silme
 @app.delete("/products/{product_id}")
-def delete_product(product_id: int, db: Session = Depends(get_db)):
+@_db_endpoint
+def delete_product(
+    product_id: int,
+    db: Session = Depends(get_db),
+    claims: Optional[dict] = Depends(get_business_claims),
+):
     db_product = db.query(ProductDB).filter(ProductDB.id == product_id).first()
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
+    _authorize_business(claims, db_product.business_id)
 
+    _remove_product_from_search(db, product_id)
     db.delete(db_product)
     db.commit()
     return {"message": "Product deleted"}
 
 
 # 11) Sıralama Güncelleme
+def _bulk_set_product_sequences(db: Session, business_id: int, sequences: dict) -> None:
+    # Tek UPDATE ... SET sequence = CASE id WHEN .. THEN .. END
+    db.query(ProductDB).filter(
+        ProductDB.business_id == business_id,
+        ProductDB.id.in_(list(sequences)),
+    ).update(
+        {ProductDB.sequence: case(sequences, value=ProductDB.id)},
+        synchronize_session=False,
+    )
+
+
 @app.post("/products/reorder")
-def reorder_products(items: List[ReorderItem], db: Session = Depends(get_db)):
-    for item in items:
-        db_product = db.query(ProductDB).filter(ProductDB.id == item.id).first()
-        if db_product:
-            db_product.sequence = item.sequence
+@_db_endpoint
+def reorder_products(
+    items: List[ReorderItem],
+    db: Session = Depends(get_db),
+    claims: Optional[dict] = Depends(get_business_claims),
+):
+    sequences = {item.id: item.sequence for item in items}
+    if not sequences:
+        return {"message": "Order updated"}
+    business_ids = {
+        row[0]
+        for row in db.query(ProductDB.business_id)
+        .filter(ProductDB.id.in_(list(sequences)))
+        .distinct()
+        .all()
+    }
+    if not business_ids:
+        return {"message": "Order updated"}
+    if len(business_ids) > 1:
+        raise HTTPException(status_code=400, detail="Products belong to different businesses")
+    business_id = business_ids.pop()
+    _authorize_business(claims, business_id)
+
+    _bulk_set_product_sequences(db, business_id, sequences)
     db.commit()
     return {"message": "Order updated"}
 
 
+# 11a) Ürün Taşıma ("X'i Y'nin arkasına al")
+# Sira anahtarlari seyrek tutulur: araya girilen urun komsularinin ortasini
+# alir ve yalnizca kendi satiri guncellenir. Bosluk kalmadiginda menu bir kez
+# PRODUCT_SEQUENCE_GAP araliklariyla yeniden numaralanir.
+PRODUCT_SEQUENCE_GAP = 1024
+
+
+def _renumber_product_sequences(db: Session, business_id: int) -> None:
+    ids = [
+        row[0]
+        for row in db.query(ProductDB.id)
+        .filter(ProductDB.business_id == business_id)
+        .order_by(ProductDB.sequence.asc(), ProductDB.id.asc())
+        .all()
+    ]
+    _bulk_set_product_sequences(
+        db,
+        business_id,
+        {product_id: (index + 1) * PRODUCT_SEQUENCE_GAP for index, product_id in enumerate(ids)},
+    )
+
+
+def _sequence_between(
+    db: Session, product: ProductDB, after: Optional[ProductDB]
+) -> Optional[int]:
+    query = db.query(ProductDB.sequence).filter(
+        ProductDB.business_id == product.business_id,
+        ProductDB.id != product.id,
+    )
+    if after is not None:
+        query = query.filter(
+            or_(
+                ProductDB.sequence > after.sequence,
+                and_(ProductDB.sequence == after.sequence, ProductDB.id > after.id),
+            )
+        )
+    following = query.order_by(ProductDB.sequence.asc(), ProductDB.id.asc()).first()
+    if after is None:
+        return following[0] - PRODUCT_SEQUENCE_GAP if following else 0
+    if following is None:
+        return after.sequence + PRODUCT_SEQUENCE_GAP
+    if following[0] - after.sequence < 2:
+        return None  # arada bos anahtar yok
+    return (after.sequence + following[0]) // 2
+
+
+@app.post("/products/{product_id}/move")
+@_db_endpoint
+def move_product(
+    product_id: int,
+    move: ProductMove,
+    db: Session = Depends(get_db),
+    claims: Optional[dict] = Depends(get_business_claims),
+):
+    product = db.query(ProductDB).filter(ProductDB.id == product_id).first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    _authorize_business(claims, product.business_id)
+
+    after = None
+    if move.after_id is not None:
+        if move.after_id == product_id:
+            raise HTTPException(status_code=400, detail="Cannot move a product after itself")
+        after = (
+            db.query(ProductDB)
+            .filter(
+                ProductDB.id == move.after_id,
+                ProductDB.business_id == product.business_id,
+            )
+            .first()
+        )
+        if not after:
+            raise HTTPException(status_code=404, detail="Target product not found")
+
+    sequence = _sequence_between(db, product, after)
+    if sequence is None:
+        _renumber_product_sequences(db, product.business_id)
+        db.expire_all()
+        sequence = _sequence_between(db, product, after)
+    product.sequence = sequence
+    db.commit()
+    return {"message": "Order updated", "sequence": sequence}
+
+
 # 12) SİPARİŞ DURUMU GÜNCELLEME
 @app.put("/orders/{order_id}/status")
-def update_order_status(order_id: int, update: OrderStatusUpdate, db: Session = Depends(get_db)):
+@_db_endpoint
+def update_order_status(
+    order_id: int,
+    update: OrderStatusUpdate,
+    db: Session = Depends(get_db),
+    claims: Optional[dict] = Depends(get_business_claims),
+):
     order = db.query(OrderDB).filter(OrderDB.id == order_id).first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-
+    _authorize_business(claims, order.business_id)
+
+    was_cancelled = order.status == ORDER_CANCELLED_STATUS
+    is_cancelled = update.status == ORDER_CANCELLED_STATUS
+    if was_cancelled != is_cancelled and order.created_at is not None:
+        _record_order_rollup(
+            db,
+            order.business_id,
+            order.created_at,
+            order.total_price,
+            [
+                {"product_name": item.product_name, "quantity": item.quantity, "price": item.price}
+                for item in order.items
+            ],
+            cancelled=1 if is_cancelled else -1,
+        )
     order.status = update.status
     if update.reason:
         order.rejection_reason = update.reason
 
     db.commit()
+    biz = db.get(BusinessDB, order.business_id)
+    _publish_order_event("order_status", order, biz.email if biz else None)
     return {"message": "Status updated"}
 
 
+# 12a) İşletme Analitiği (rollup tablolarından)
+def _analytics_bucket_out(bucket: datetime.datetime, row) -> BusinessAnalyticsBucket:
+    return BusinessAnalyticsBucket(
+        bucket=bucket,
+        order_count=row.order_count or 0,
+        revenue=round(row.revenue or 0, 2),
+        cancelled_count=row.cancelled_count or 0,
+        review_count=row.review_count or 0,
+        rating_avg=(
+            round(row.rating_sum / row.review_count, 2) if row.review_count else None
+        ),
+    )
+
+
+@app.get("/business/{email}/analytics", response_model=BusinessAnalyticsOut)
+@_db_endpoint
+def get_business_analytics(
+    email: str,
+    start: Optional[datetime.date] = None,
+    end: Optional[datetime.date] = None,
+    granularity: str = "day",
+    top: int = 10,
+    db: Session = Depends(get_db),
+    claims: Optional[dict] = Depends(get_business_claims),
+):
+    if granularity not in ("day", "hour"):
+        raise HTTPException(status_code=400, detail="Invalid granularity (day/hour)")
+    biz = db.query(BusinessDB).filter(BusinessDB.email == email.strip().lower()).first()
+    if not biz:
+        raise HTTPException(status_code=404, detail="Business not found")
+    _authorize_business(claims, biz.id)
+
+    # Tarihler Turkiye saatine gore, iki uc dahil
+    end = end or _turkey_now().date()
+    start = start or end - datetime.timedelta(days=6)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    max_days = 31 if granularity == "hour" else 366
+    if (end - start).days >= max_days:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {max_days} days")
+    range_start = datetime.datetime.combine(start, datetime.time())
+    range_end = datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time())
+    top = max(1, min(top, 50))
+
+    model = BusinessStatsHourlyDB if granularity == "hour" else BusinessStatsDailyDB
+    rows = (
+        db.query(model)
+        .filter(
+            model.business_id == biz.id,
+            model.bucket >= range_start,
+            model.bucket < range_end,
+        )
+        .order_by(model.bucket.asc())
+        .all()
+    )
+    series = [_analytics_bucket_out(row.bucket, row) for row in rows]
+    totals = BusinessAnalyticsBucket(
+        bucket=range_start,
+        order_count=sum(row.order_count or 0 for row in rows),
+        revenue=round(sum(row.revenue or 0 for row in rows), 2),
+        cancelled_count=sum(row.cancelled_count or 0 for row in rows),
+        review_count=sum(row.review_count or 0 for row in rows),
+    )
+    rating_sum = sum(row.rating_sum or 0 for row in rows)
+    if totals.review_count:
+        totals.rating_avg = round(rating_sum / totals.review_count, 2)
+
+    quantity = func.sum(BusinessProductStatsDailyDB.quantity)
+    products = (
+        db.query(
+            BusinessProductStatsDailyDB.product_name,
+            quantity,
+            func.sum(BusinessProductStatsDailyDB.revenue),
+        )
+        .filter(
+            BusinessProductStatsDailyDB.business_id == biz.id,
+            BusinessProductStatsDailyDB.bucket >= range_start,
+            BusinessProductStatsDailyDB.bucket < range_end,
+        )
+        .group_by(BusinessProductStatsDailyDB.product_name)
+        .having(quantity > 0)
+        .order_by(quantity.desc())
+        .limit(top)
+        .all()
+    )
+    return BusinessAnalyticsOut(
+        start=start,
+        end=end,
+        granularity=granularity,
+        totals=totals,
+        series=series,
+        top_products=[
+            BusinessAnalyticsProduct(
+                product_name=name, quantity=int(qty or 0), revenue=round(revenue or 0, 2)
+            )
+            for name, qty, revenue in products
+        ],
+    )
+
+
 # 13) İŞLETME DURUMU (AÇIK/KAPALI)
 @app.put("/business/{email}/status")
-def update_business_status(email: str, is_open: bool = Body(..., embed=True), db: Session = Depends(get_db)):
-    biz = db.query(BusinessDB).filter(BusinessDB.email == email).first()
+@_db_endpoint
+def update_business_status(
+    email: str,
+    is_open: bool = Body(..., embed=True),
+    db: Session = Depends(get_db),
+    claims: Optional[dict] = Depends(get_business_claims),
+):
+    biz = db.query(BusinessDB).filter(BusinessDB.email == email.strip().lower()).first()
     if not biz:
         raise HTTPException(status_code=404, detail="Business not found")
+    _authorize_business(claims, biz.id)
 
     biz.is_open = is_open
     db.commit()
+    _invalidate_business_directory(biz.category)
     return {"message": "Status updated"}
 
 
+# --- Begeni sayaclari (write-behind) ---
+# Begeni/vazgecme farklari bellekte biriktirilir ve RECIPE_LIKE_FLUSH_SECONDS
+# aralikla tek executemany ile "likes = likes + :delta" olarak yazilir. Okuma
+# yapan endpoint'ler bekleyen farki ekler; birden fazla worker varsa diger
+# worker'lar sayaci en gec bir flush araligi sonra gorur.
+RECIPE_LIKE_FLUSH_SECONDS = float(os.environ.get("EATY_LIKE_FLUSH_SECONDS", "1.0"))
+
+
+def reconcile_recipe_likes(db: Session) -> int:
+    # Cokmede kaybolan deltalari recipe_likes satirlarindan duzeltir. Yalnizca
+    # CLI'dan calisir: worker'larin henuz yazmadigi deltalar zaten sayilmis
+    # satirlara aittir ve yeniden sayimdan sonra ikinci kez eklenirdi.
+    count = (
+        db.query(func.count(RecipeLikeDB.id))
+        .filter(RecipeLikeDB.recipe_id == RecipeDB.id)
+        .scalar_subquery()
+    )
+    fixed = (
+        db.query(RecipeDB)
+        .filter(func.coalesce(RecipeDB.likes, 0) != count)
+        .update({RecipeDB.likes: count}, synchronize_session=False)
+    )
+    db.commit()
+    return fixed
+
+
+class RecipeLikeCounter:
+    # Okumalar recipes.likes'i bekleyen ve yazilmakta olan deltalarla birlestirir.
+    # _generation yazim sirasinda tektir; okuma DB'yi okumadan once ve deltalari
+    # topladiktan sonra ayni cift degeri gormezse tekrarlanir, boylece commit
+    # anina denk gelen okuma bir partiyi iki kez saymaz ya da dusurmez.
+    def __init__(self, interval: float):
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._pending: dict = collections.defaultdict(int)
+        self._inflight: dict = {}
+        self._generation = 0
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, recipe_id: int, delta: int) -> None:
+        with self._lock:
+            self._pending[recipe_id] += delta
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="recipe-like-flush", daemon=True
+                )
+                self._thread.start()
+
+    def current(self, db: Session, recipe_ids: List[int]) -> dict[int, int]:
+        if not recipe_ids:
+            return {}
+        for _ in range(3):
+            with self._lock:
+                generation = self._generation
+            if generation % 2:
+                if not ASYNC_DB:
+                    time.sleep(0.001)
+                continue
+            counts = self._read(db, recipe_ids, generation)
+            if counts is not None:
+                return counts
+        if ASYNC_DB:
+            # run_sync event loop thread'inde calisir, beklemek tum istekleri
+            # durdurur: commit'e denk gelen okuma bu partiyi bir kez fazla
+            # gosterebilir, DB'deki sayac etkilenmez
+            return self._read(db, recipe_ids, None)
+        # Yazimlar arka arkaya denk geldi: partinin bitmesini bekleyip oku
+        with self._flush_lock:
+            return self._read(db, recipe_ids, None)
+
+    def _read(
+        self, db: Session, recipe_ids: List[int], generation: Optional[int]
+    ) -> Optional[dict[int, int]]:
+        stored = dict(
+            db.query(RecipeDB.id, RecipeDB.likes).filter(RecipeDB.id.in_(recipe_ids)).all()
+        )
+        with self._lock:
+            if generation is not None and self._generation != generation:
+                return None
+            return {
+                recipe_id: max(
+                    (stored.get(recipe_id) or 0)
+                    + self._pending.get(recipe_id, 0)
+                    + self._inflight.get(recipe_id, 0),
+                    0,
+                )
+                for recipe_id in recipe_ids
+            }
+
+    def discard(self, recipe_id: int) -> None:
+        with self._lock:
+            self._pending.pop(recipe_id, None)
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self) -> int:
+        with self._lock:
+            batch = {
+                recipe_id: delta for recipe_id, delta in self._pending.items() if delta
+            }
+            self._pending.clear()
+            self._inflight = batch
+        if not batch:
+            return 0
+        likes = func.coalesce(RecipeDB.likes, 0) + bindparam("delta")
+        statement = (
+            RecipeDB.__table__.update()
+            .where(RecipeDB.__table__.c.id == bindparam("recipe_id"))
+            .values(likes=case((likes < 0, 0), else_=likes))
+        )
+        with self._lock:
+            self._generation += 1
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    statement,
+                    [
+                        {"recipe_id": recipe_id, "delta": delta}
+                        for recipe_id, delta in batch.items()
+                    ],
+                )
+        except Exception:
+            with self._lock:  # bir sonraki turda yeniden denenir
+                for recipe_id, delta in batch.items():
+                    self._pending[recipe_id] += delta
+                self._inflight = {}
+                self._generation += 1
+            raise
+        with self._lock:
+            self._inflight = {}
+            self._generation += 1
+        return len(batch)
+
+    def _run(self) -> None:
+        while not self._wakeup.wait(self._interval):
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+
+recipe_like_counter = RecipeLikeCounter(RECIPE_LIKE_FLUSH_SECONDS)
+atexit.register(recipe_like_counter.flush)
+
+
+# --- Trend skorlari ---
+# hot_score = sum(agirlik * exp(lambda * (olay_ani - epoch))). Skor zamanla
+# yeniden hesaplanmaz: tum tariflerin ortak exp(-lambda * (simdi - epoch))
+# carpani siralamayi degistirmez, bu yuzden ORDER BY hot_score her an decay
+# uygulanmis siralamayi verir. Yeni olaylarin katkisi buyudugu icin epoch
+# RECIPE_TRENDING_RENORMALIZE_HOURS'ta bir ileri alinir ve tum skorlar ayni
+# carpanla kuculturulur. Olaylar bellekte toplanip likes gibi toplu yazilir.
+RECIPE_TRENDING_HALF_LIFE_HOURS = float(
+    os.environ.get("EATY_TRENDING_HALF_LIFE_HOURS", "24")
+)
+RECIPE_TRENDING_RENORMALIZE_HOURS = float(
+    os.environ.get("EATY_TRENDING_RENORMALIZE_HOURS", "24")
+)
+RECIPE_TRENDING_WEIGHTS = {"create": 1.0, "like": 1.0, "comment": 2.0, "save": 3.0}
+_TRENDING_DECAY_PER_SECOND = math.log(2) / (RECIPE_TRENDING_HALF_LIFE_HOURS * 3600)
+
+
+def _trending_growth(moment: datetime.datetime, epoch: datetime.datetime) -> float:
+    return math.exp(_TRENDING_DECAY_PER_SECOND * (moment - epoch).total_seconds())
+
+
+def _lock_trending_epoch(db: Session) -> datetime.datetime:
+    state = (
+        db.query(RecipeTrendingStateDB)
+        .filter(RecipeTrendingStateDB.id == 1)
+        .with_for_update()
+        .first()
+    )
+    if state is None:
+        state = RecipeTrendingStateDB(id=1, epoch=datetime.datetime.utcnow())
+        db.add(state)
+        db.flush()
+    return state.epoch
+
+
+def renormalize_trending_scores(db: Session, force: bool = False) -> bool:
+    now = datetime.datetime.utcnow()
+    epoch = _lock_trending_epoch(db)
+    age = now - epoch
+    if not force and age < datetime.timedelta(hours=RECIPE_TRENDING_RENORMALIZE_HOURS):
+        db.rollback()
+        return False
+    db.query(RecipeDB).filter(RecipeDB.hot_score.isnot(None)).update(
+        {RecipeDB.hot_score: RecipeDB.hot_score / _trending_growth(now, epoch)},
+        synchronize_session=False,
+    )
+    db.query(RecipeTrendingStateDB).filter(RecipeTrendingStateDB.id == 1).update(
+        {RecipeTrendingStateDB.epoch: now}, synchronize_session=False
+    )
+    db.commit()
+    return True
+
+
+def rebuild_trending_scores(db: Session, only_missing: bool = False) -> int:
+    # Skorlari mevcut begeni/yorum/kaydetme kayitlarindan bastan hesaplar
+    epoch = _lock_trending_epoch(db)
+    query = db.query(RecipeDB.id, RecipeDB.created_at)
+    if only_missing:
+        query = query.filter(RecipeDB.hot_score.is_(None))
+    scores = {
+        recipe_id: RECIPE_TRENDING_WEIGHTS["create"]
+        * _trending_growth(created_at or epoch, epoch)
+        for recipe_id, created_at in query.all()
+    }
+    events = (
+        (RecipeLikeDB, RECIPE_TRENDING_WEIGHTS["like"]),
+        (RecipeCommentDB, RECIPE_TRENDING_WEIGHTS["comment"]),
+        (RecipeNotebookItemDB, RECIPE_TRENDING_WEIGHTS["save"]),
+    )
+    for model, weight in events:
+        for recipe_id, created_at in db.query(model.recipe_id, model.created_at).yield_per(
+            1000
+        ):
+            if recipe_id in scores:
+                scores[recipe_id] += weight * _trending_growth(created_at or epoch, epoch)
+    if scores:
+        db.execute(
+            RecipeDB.__table__.update()
+            .where(RecipeDB.__table__.c.id == bindparam("recipe_id"))
+            .values(hot_score=bindparam("score")),
+            [
+                {"recipe_id": recipe_id, "score": score}
+                for recipe_id, score in scores.items()
+            ],
+        )
+    db.commit()
+    return len(scores)
+
+
+class RecipeHotScoreBuffer:
+    def __init__(self, interval: float):
+        self._interval = interval
+        self._reference = datetime.datetime.utcnow()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: dict = collections.defaultdict(float)
+        self._epoch: Optional[datetime.datetime] = None
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(
+        self, recipe_id: int, weight: float, moment: Optional[datetime.datetime] = None
+    ) -> None:
+        # Katki olayin anina (moment, verilmezse simdi) gore ve her flush'ta
+        # ileri alinan referansa gore olceklenir; epoch'a cevirme flush
+        # sirasinda, okunan epoch ile ayni transaction'da yapilir. Geri alinan
+        # olaylar (begeni/kaydetme silme) eklendikleri anla cagrilir ki
+        # eklenenden fazlasi dusulmesin.
+        moment = moment or datetime.datetime.utcnow()
+        with self._lock:
+            growth = _trending_growth(moment, self._reference)
+            self._pending[recipe_id] += weight * growth
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="recipe-hot-score-flush", daemon=True
+                )
+                self._thread.start()
+
+    def discard(self, recipe_id: int) -> None:
+        with self._lock:
+            self._pending.pop(recipe_id, None)
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                # Tampon bosalirken referans simdiye alinir; boylece carpan
+                # surec ne kadar acik kalirsa kalsin bir flush araligini gecmez
+                batch = dict(self._pending)
+                self._pending.clear()
+                reference = self._reference
+                self._reference = datetime.datetime.utcnow()
+            if not batch:
+                return 0
+            db = SessionLocal()
+            try:
+                epoch = _lock_trending_epoch(db)
+                scale = _trending_growth(reference, epoch)
+                score = func.coalesce(RecipeDB.hot_score, 0.0) + bindparam("delta")
+                db.execute(
+                    RecipeDB.__table__.update()
+                    .where(RecipeDB.__table__.c.id == bindparam("recipe_id"))
+                    .values(hot_score=case((score < 0, 0.0), else_=score)),
+                    [
+                        {"recipe_id": recipe_id, "delta": delta * scale}
+                        for recipe_id, delta in batch.items()
+                    ],
+                )
+                db.commit()
+                self._epoch = epoch
+            except Exception:
+                with self._lock:  # bir sonraki turda yeniden denenir
+                    rebase = _trending_growth(reference, self._reference)
+                    for recipe_id, delta in batch.items():
+                        self._pending[recipe_id] += delta * rebase
+                raise
+            finally:
+                db.close()
+            return len(batch)
+
+    def _renormalize_if_due(self) -> None:
+        due = datetime.timedelta(hours=RECIPE_TRENDING_RENORMALIZE_HOURS)
+        if self._epoch is None or datetime.datetime.utcnow() - self._epoch < due:
+            return
+        db = SessionLocal()
+        try:
+            renormalize_trending_scores(db)
+            self._epoch = (
+                db.query(RecipeTrendingStateDB.epoch)
+                .filter(RecipeTrendingStateDB.id == 1)
+                .scalar()
+            )
+        finally:
+            db.close()
+
+    def _run(self) -> None:
+        while not self._wakeup.wait(self._interval):
+            try:
+                self.flush()
+                self._renormalize_if_due()
+            except Exception:
+                pass
+
+
+recipe_hot_scores = RecipeHotScoreBuffer(RECIPE_LIKE_FLUSH_SECONDS)
+atexit.register(recipe_hot_scores.flush)
+
+
+def _ensure_trending_scores():
+    db = SessionLocal()
+    try:
+        pending = db.query(RecipeDB.id).filter(RecipeDB.hot_score.is_(None)).first()
+        if pending is not None:
+            rebuild_trending_scores(db, only_missing=True)
+        else:
+            _lock_trending_epoch(db)
+            db.commit()
+    finally:
+        db.close()
+
+
+_ensure_trending_scores()
+
+
+# --- Benzer tarifler (TF-IDF) ---
+# Her tarif; normalize malzemeleri, baslik kelimeleri ve kategorisinden olusan
+# seyrek bir TF-IDF vektorudur (L2 normlu). Kosinus benzerligi scipy.sparse
+# matris carpimiyla hesaplanir (numpy/scipy yalnizca bu toplu is icin gerekir);
+# cok yaygin terimler (tuz, su ...) aday uretmeye katilmaz. Sonuclar
+# recipe_similar tablosuna yazilir, endpoint yalnizca bu tablodan okur.
+RECIPE_SIMILAR_TOP_K = int(os.environ.get("EATY_SIMILAR_TOP_K", "10"))
+RECIPE_SIMILAR_MAX_DF = 0.3  # bu orandan fazla tarifte gecen terimler atlanir
+# Tam yeniden hesaplamada bir seferde carpilan satir sayisi (bellek/hiz dengesi)
+RECIPE_SIMILAR_BLOCK_ROWS = int(os.environ.get("EATY_SIMILAR_BLOCK_ROWS", "500"))
+# Toplu isler sonuclari bu kadar satirlik ayri commit'lerle yazar; SQLite yazma
+# kilidi tum is boyunca degil yalnizca bir parti boyunca tutulur
+BATCH_JOB_WRITE_ROWS = int(os.environ.get("EATY_BATCH_JOB_WRITE_ROWS", "5000"))
+_RECIPE_SIMILAR_FIELD_WEIGHTS = {"i": 1.0, "t": 0.5, "c": 0.5}
+
+
+def _recipe_similarity_terms(
+    title: Optional[str], category: Optional[str], ingredients_json: Optional[str]
+) -> dict:
+    terms: dict = collections.defaultdict(float)
+    for ingredient in _parse_json_list(ingredients_json):
+        key = _normalize_ingredient(ingredient)
+        if key:
+            terms[f"i:{key}"] += _RECIPE_SIMILAR_FIELD_WEIGHTS["i"]
+    for word in re.split(r"[^a-z0-9]+", _fold_search_text(title)):
+        if len(word) >= 3:
+            terms[f"t:{word}"] += _RECIPE_SIMILAR_FIELD_WEIGHTS["t"]
+    folded_category = _fold_search_text(category).strip()
+    if folded_category:
+        terms[f"c:{folded_category}"] += _RECIPE_SIMILAR_FIELD_WEIGHTS["c"]
+    return terms
+
+
+def _sparse_top_k(block, k: int, offset: Optional[int] = None):
+    # CSR blogunun her satiri icin en buyuk k (sutun, skor) dizisini verir;
+    # offset verilirse satirin kendi sutunu (offset + satir) atlanir. Esit
+    # skorlarda kucuk sutun once gelir.
+    import numpy as np
+
+    for row in range(block.shape[0]):
+        start, end = block.indptr[row], block.indptr[row + 1]
+        cols = block.indices[start:end]
+        values = block.data[start:end]
+        keep = values > 0
+        if offset is not None:
+            keep &= cols != offset + row
+        cols, values = cols[keep], values[keep]
+        if len(values) > k:
+            threshold = np.partition(values, len(values) - k)[len(values) - k]
+            keep = values >= threshold
+            cols, values = cols[keep], values[keep]
+        order = np.lexsort((cols, -values))[:k]
+        yield cols[order], values[order]
+
+
+def _recipe_similarity_vector(
+    terms: dict, idf: dict, common: set, default_idf: float
+) -> Optional[dict]:
+    # L2 normlu TF-IDF agirliklari; yaygin terimler norma girer ama satira
+    # yazilmaz. Hic agirligi olmayan tarif icin None.
+    weights = {term: tf * idf.get(term, default_idf) for term, tf in terms.items()}
+    norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+    if not norm:
+        return None
+    return {term: weight / norm for term, weight in weights.items() if term not in common}
+
+
+class RecipeSimilarityModel:
+    # Tarifler L2-normalize TF-IDF satirlari olarak scipy.sparse CSR matriste
+    # tutulur; komsular X[satirlar] @ X^T carpimiyla bloklar halinde bulunur.
+    # RECIPE_SIMILAR_MAX_DF'ten yaygin terimler norma girer ama matristen
+    # cikarilir: carpim seyrek kalir ve "tuz" gibi terimler her cifti
+    # benzer gostermez. vectors tarif id sirasiyla verilir.
+    def __init__(self, vectors: dict):
+        import numpy as np
+        from scipy import sparse
+
+        vocabulary: dict = {}
+        ids, indptr, indices, data = [], [0], [], []
+        for recipe_id, vector in vectors.items():
+            ids.append(recipe_id)
+            for term, weight in vector.items():
+                indices.append(vocabulary.setdefault(term, len(vocabulary)))
+                data.append(weight)
+            indptr.append(len(indices))
+        self.ids = np.array(ids, dtype=np.int64)
+        self.terms = list(vocabulary)
+        self._rows = {recipe_id: row for row, recipe_id in enumerate(ids)}
+        self.matrix = sparse.csr_matrix(
+            (data, indices, indptr), shape=(len(ids), len(vocabulary))
+        )
+        self._transposed = self.matrix.T.tocsr()
+
+    @classmethod
+    def from_recipes(cls, db: Session) -> tuple["RecipeSimilarityModel", dict, set]:
+        # Tum tariflerden yeni model; IDF ve yaygin terimlerle birlikte doner
+        rows = (
+            db.query(RecipeDB.id, RecipeDB.title, RecipeDB.category, RecipeDB.ingredients_json)
+            .order_by(RecipeDB.id.asc())
+            .yield_per(1000)
+        )
+        counts = {
+            recipe_id: _recipe_similarity_terms(title, category, ingredients_json)
+            for recipe_id, title, category, ingredients_json in rows
+        }
+        document_frequency: dict = collections.Counter()
+        for terms in counts.values():
+            document_frequency.update(terms.keys())
+        total = len(counts)
+        idf = {
+            term: math.log((1 + total) / (1 + df)) + 1.0
+            for term, df in document_frequency.items()
+        }
+        max_df = max(2, int(total * RECIPE_SIMILAR_MAX_DF))
+        common = {term for term, df in document_frequency.items() if df > max_df}
+        vectors = {}
+        for recipe_id, terms in counts.items():
+            vector = _recipe_similarity_vector(terms, idf, common, 0.0)
+            if vector is not None:
+                vectors[recipe_id] = vector
+        return cls(vectors), idf, common
+
+    def vector(self, row: int) -> dict:
+        start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+        return {
+            self.terms[column]: weight
+            for column, weight in zip(
+                self.matrix.indices[start:end].tolist(), self.matrix.data[start:end].tolist()
+            )
+        }
+
+    def _pairs(self, cols, values) -> List[tuple[int, float]]:
+        return list(zip(self.ids[cols].tolist(), values.tolist()))
+
+    def neighbours(self, recipe_id: int, k: int) -> List[tuple[int, float]]:
+        row = self._rows.get(recipe_id)
+        if row is None:
+            return []
+        scores = (self.matrix[row] @ self._transposed).tocsr()
+        cols, values = next(_sparse_top_k(scores, k, offset=row))
+        return self._pairs(cols, values)
+
+    def all_neighbours(self, k: int):
+        for start in range(0, len(self.ids), RECIPE_SIMILAR_BLOCK_ROWS):
+            block = (
+                self.matrix[start : start + RECIPE_SIMILAR_BLOCK_ROWS] @ self._transposed
+            ).tocsr()
+            for row, (cols, values) in enumerate(_sparse_top_k(block, k, offset=start)):
+                yield int(self.ids[start + row]), self._pairs(cols, values)
+
+
+def _similar_rows(recipe_id: int, neighbours: List[tuple[int, float]]) -> List[dict]:
+    return [
+        {"recipe_id": recipe_id, "similar_recipe_id": other_id, "score": score}
+        for other_id, score in neighbours
+    ]
+
+
+def _replace_rows_in_batches(db: Session, key_column, groups) -> None:
+    # groups: (anahtar, satirlar) dizisi. Her parti kendi anahtarlarinin eski
+    # satirlarini silip yenilerini yazar ve commit eder; okuyucular bir
+    # anahtarin listesini hep eski ya da yeni haliyle tam gorur.
+    table = key_column.table
+    keys, rows = [], []
+
+    def write() -> None:
+        db.execute(table.delete().where(key_column.in_(keys)))
+        if rows:
+            db.execute(table.insert(), rows)
+        db.commit()
+        keys.clear()
+        rows.clear()
+
+    for key, key_rows in groups:
+        keys.append(key)
+        rows.extend(key_rows)
+        if len(rows) >= BATCH_JOB_WRITE_ROWS or len(keys) >= 500:
+            write()
+    if keys:
+        write()
+
+
+def rebuild_similar_recipes(db: Session) -> int:
+    queued = [row[0] for row in db.query(RecipeSimilarityQueueDB.recipe_id).all()]
+    model, idf, common = RecipeSimilarityModel.from_recipes(db)
+    db.commit()
+    _replace_rows_in_batches(
+        db,
+        RecipeSimilarDB.__table__.c.recipe_id,
+        (
+            (recipe_id, _similar_rows(recipe_id, neighbours))
+            for recipe_id, neighbours in model.all_neighbours(RECIPE_SIMILAR_TOP_K)
+        ),
+    )
+    # refresh'in kullandigi vektorler ve IDF degerleri de yenilenir
+    _replace_rows_in_batches(
+        db,
+        RecipeSimilarityVectorDB.__table__.c.recipe_id,
+        (
+            (recipe_id, [{"recipe_id": recipe_id, "vector_json": json.dumps(model.vector(row))}])
+            for row, recipe_id in enumerate(model.ids.tolist())
+        ),
+    )
+    db.query(RecipeSimilarityTermDB).delete(synchronize_session=False)
+    if idf:
+        db.execute(
+            RecipeSimilarityTermDB.__table__.insert(),
+            [
+                {"term": term, "idf": value, "common": term in common}
+                for term, value in idf.items()
+            ],
+        )
+    db.commit()
+    # Silinmis ya da artik vektoru olmayan tariflerin satirlari temizlenir
+    live = set(model.ids.tolist())
+    for model_class in (RecipeSimilarDB, RecipeSimilarityVectorDB):
+        key_column = model_class.__table__.c.recipe_id
+        stale = {row[0] for row in db.query(key_column).distinct().all()} - live
+        _replace_rows_in_batches(db, key_column, ((recipe_id, []) for recipe_id in stale))
+    # Is surerken kuyruga eklenenler bir sonraki refresh'e kalir
+    for start in range(0, len(queued), 500):
+        db.query(RecipeSimilarityQueueDB).filter(
+            RecipeSimilarityQueueDB.recipe_id.in_(queued[start : start + 500])
+        ).delete(synchronize_session=False)
+        db.commit()
+    return len(model.ids)
+
+
+def refresh_similar_recipes(db: Session) -> int:
+    # Kuyruktaki tarifler son tam hesaplamanin IDF degerleriyle yeniden
+    # vektorlenir ve saklanan matrisin tamamina karsi puanlanir (X @ q). Komsu
+    # listesindeki en dusuk skoru gecilen her tarifin listesi guncellenir; top-k
+    # simetrik olmadigi icin kuyruktaki tarifin kendi komsulari yetmez. IDF
+    # katalog buyudukce kayar: rebuild-similar-recipes periyodik (ornegin
+    # gecelik) calistirilmalidir.
+    import numpy as np
+
+    queued = sorted(row[0] for row in db.query(RecipeSimilarityQueueDB.recipe_id).all())
+    if not queued:
+        return 0
+    if db.query(RecipeSimilarityVectorDB.recipe_id).first() is None:
+        rebuild_similar_recipes(db)  # henuz tam hesaplama yapilmamis
+        return len(queued)
+    k = RECIPE_SIMILAR_TOP_K
+    chunks = [queued[start : start + 500] for start in range(0, len(queued), 500)]
+
+    counts = {}
+    for chunk in chunks:
+        for recipe_id, title, category, ingredients_json in db.query(
+            RecipeDB.id, RecipeDB.title, RecipeDB.category, RecipeDB.ingredients_json
+        ).filter(RecipeDB.id.in_(chunk)):
+            counts[recipe_id] = _recipe_similarity_terms(title, category, ingredients_json)
+    terms = sorted({term for recipe_terms in counts.values() for term in recipe_terms})
+    idf, common = {}, set()
+    for start in range(0, len(terms), 500):
+        for term, value, is_common in db.query(
+            RecipeSimilarityTermDB.term,
+            RecipeSimilarityTermDB.idf,
+            RecipeSimilarityTermDB.common,
+        ).filter(RecipeSimilarityTermDB.term.in_(terms[start : start + 500])):
+            idf[term] = value
+            if is_common:
+                common.add(term)
+    # Son tam hesaplamadan sonra ilk kez gorulen terimler tek tarifte geciyor sayilir
+    total = db.query(func.count(RecipeSimilarityVectorDB.recipe_id)).scalar() or 0
+    default_idf = math.log((1 + total) / 2) + 1.0
+    vectors = {
+        recipe_id: _recipe_similarity_vector(recipe_terms, idf, common, default_idf)
+        for recipe_id, recipe_terms in counts.items()
+    }
+    vector_table = RecipeSimilarityVectorDB.__table__
+    for chunk in chunks:
+        db.execute(vector_table.delete().where(vector_table.c.recipe_id.in_(chunk)))
+    stored_vectors = [
+        {"recipe_id": recipe_id, "vector_json": json.dumps(vector)}
+        for recipe_id, vector in vectors.items()
+        if vector is not None
+    ]
+    if stored_vectors:
+        db.execute(vector_table.insert(), stored_vectors)
+    db.commit()
+
+    model = RecipeSimilarityModel(
+        {
+            recipe_id: json.loads(vector_json)
+            for recipe_id, vector_json in db.query(
+                RecipeSimilarityVectorDB.recipe_id, RecipeSimilarityVectorDB.vector_json
+            )
+            .order_by(RecipeSimilarityVectorDB.recipe_id.asc())
+            .yield_per(1000)
+        }
+    )
+    queued_set = set(queued)
+    updates = {recipe_id: model.neighbours(recipe_id, k) for recipe_id in queued}
+    queued_rows = [model._rows[recipe_id] for recipe_id in queued if recipe_id in model._rows]
+    if queued_rows:
+        # reverse[r, j]: r. tarifin j. kuyruk tarifine benzerligi
+        reverse = (model.matrix @ model.matrix[queued_rows].T).tocsr()
+        queued_ids = model.ids[queued_rows]
+        candidates = {}
+        for row in np.flatnonzero(np.diff(reverse.indptr)).tolist():
+            recipe_id = int(model.ids[row])
+            if recipe_id in queued_set:
+                continue
+            start, end = reverse.indptr[row], reverse.indptr[row + 1]
+            values = reverse.data[start:end]
+            keep = values > 0
+            if keep.any():
+                candidates[recipe_id] = list(
+                    zip(
+                        queued_ids[reverse.indices[start:end][keep]].tolist(),
+                        values[keep].tolist(),
+                    )
+                )
+        candidate_ids = list(candidates)
+        thresholds = {}
+        for start in range(0, len(candidate_ids), 500):
+            for recipe_id, count, min_score in (
+                db.query(
+                    RecipeSimilarDB.recipe_id,
+                    func.count(RecipeSimilarDB.similar_recipe_id),
+                    func.min(RecipeSimilarDB.score),
+                )
+                .filter(RecipeSimilarDB.recipe_id.in_(candidate_ids[start : start + 500]))
+                .group_by(RecipeSimilarDB.recipe_id)
+            ):
+                thresholds[recipe_id] = min_score if count >= k else 0.0
+        beaten = [
+            recipe_id
+            for recipe_id, pairs in candidates.items()
+            if any(score > thresholds.get(recipe_id, 0.0) for _, score in pairs)
+        ]
+        current: dict = collections.defaultdict(list)
+        for start in range(0, len(beaten), 500):
+            for recipe_id, other_id, score in db.query(
+                RecipeSimilarDB.recipe_id,
+                RecipeSimilarDB.similar_recipe_id,
+                RecipeSimilarDB.score,
+            ).filter(RecipeSimilarDB.recipe_id.in_(beaten[start : start + 500])):
+                current[recipe_id].append((other_id, score))
+        for recipe_id in beaten:
+            pairs = current[recipe_id]
+            if any(other_id in queued_set for other_id, _ in pairs):
+                # Eski listede kuyruktaki bir tarif var: skoru dusmus olabilir
+                updates[recipe_id] = model.neighbours(recipe_id, k)
+                continue
+            merged = pairs + candidates[recipe_id]
+            merged.sort(key=lambda pair: (-pair[1], pair[0]))
+            updates[recipe_id] = merged[:k]
+    db.commit()
+
+    _replace_rows_in_batches(
+        db,
+        RecipeSimilarDB.__table__.c.recipe_id,
+        (
+            (recipe_id, _similar_rows(recipe_id, neighbours))
+            for recipe_id, neighbours in updates.items()
+        ),
+    )
+    for chunk in chunks:
+        db.query(RecipeSimilarityQueueDB).filter(
+            RecipeSimilarityQueueDB.recipe_id.in_(chunk)
+        ).delete(synchronize_session=False)
+        db.commit()
+    return len(queued)
+
+
+def _queue_similarity_refresh(db: Session, recipe_ids) -> None:
+    for recipe_id in recipe_ids:
+        db.merge(RecipeSimilarityQueueDB(recipe_id=recipe_id))
+
+
+def _recipes_listing_as_similar(db: Session, recipe_id: int) -> List[int]:
+    # Bu tarifi komsu olarak tutan tarifler; tarif degisince ya da silinince
+    # onlarin listeleri de bayatlar
+    return [
+        row[0]
+        for row in db.query(RecipeSimilarDB.recipe_id)
+        .filter(RecipeSimilarDB.similar_recipe_id == recipe_id)
+        .all()
+    ]
+
+
+# --- Kisisel oneriler (item-item collaborative filtering) ---
+# Kullanici x tarif matrisi begeniler ve defter kayitlarindan kurulur (kayit
+# daha guclu sinyal). Ayni kullanicida birlikte gecen tarif ciftleri uzerinden
+# kosinus benzerligi hesaplanir, her tarifin en yakin komsulari tutulur ve
+# kullanicinin etkilesimlerine gore puanlanan adaylar recipe_user_candidates
+# tablosuna yazilir. Matris islemleri scipy.sparse ile bloklar halinde yapilir
+# (numpy/scipy yalnizca bu toplu isler icin gerekir, ice aktarma fonksiyon
+# icindedir). Is periyodik olarak (cron) rebuild-recommendations ile
+# calistirilir; feed istek basina yalnizca bu tabloyu okur.
+RECOMMENDATION_WEIGHTS = {"like": 1.0, "save": 2.0}
+RECOMMENDATION_MAX_USER_ITEMS = 50  # kullanici basina en yeni etkilesimler
+RECOMMENDATION_ITEM_NEIGHBOURS = 30
+RECOMMENDATION_CANDIDATES = int(os.environ.get("EATY_RECOMMENDATION_CANDIDATES", "100"))
+RECOMMENDATION_BLOCK_ROWS = int(os.environ.get("EATY_RECOMMENDATION_BLOCK_ROWS", "1000"))
+
+
+def _load_recipe_interactions(db: Session) -> dict:
+    events: dict = collections.defaultdict(list)
+    likes = db.query(
+        RecipeLikeDB.user_email, RecipeLikeDB.recipe_id, RecipeLikeDB.created_at
+    ).yield_per(1000)
+    for user_email, recipe_id, created_at in likes:
+        events[user_email].append((created_at, recipe_id, RECOMMENDATION_WEIGHTS["like"]))
+    saves = (
+        db.query(
+            RecipeNotebookDB.owner_email,
+            RecipeNotebookItemDB.recipe_id,
+            RecipeNotebookItemDB.created_at,
+        )
+        .join(RecipeNotebookDB, RecipeNotebookDB.id == RecipeNotebookItemDB.notebook_id)
+        .yield_per(1000)
+    )
+    for owner_email, recipe_id, created_at in saves:
+        if owner_email:
+            events[owner_email].append((created_at, recipe_id, RECOMMENDATION_WEIGHTS["save"]))
+
+    epoch = datetime.datetime.min
+    interactions = {}
+    for user_email, user_events in events.items():
+        user_events.sort(key=lambda event: event[0] or epoch, reverse=True)
+        weights: dict = collections.defaultdict(float)
+        for _, recipe_id, weight in user_events:
+            if recipe_id in weights or len(weights) < RECOMMENDATION_MAX_USER_ITEMS:
+                weights[recipe_id] += weight
+        interactions[user_email] = weights
+    return interactions
+
+
+def _recipe_interaction_matrix(interactions: dict):
+    # Kullanici x tarif CSR matrisi; satir/sutun sirasi users/recipe_ids'dir
+    import numpy as np
+    from scipy import sparse
+
+    users = list(interactions)
+    recipe_ids = sorted({recipe_id for weights in interactions.values() for recipe_id in weights})
+    columns = {recipe_id: column for column, recipe_id in enumerate(recipe_ids)}
+    rows, cols, data = [], [], []
+    for row, user_email in enumerate(users):
+        for recipe_id, weight in interactions[user_email].items():
+            rows.append(row)
+            cols.append(columns[recipe_id])
+            data.append(weight)
+    matrix = sparse.csr_matrix(
+        (data, (rows, cols)), shape=(len(users), len(recipe_ids)), dtype=np.float64
+    )
+    return users, np.array(recipe_ids, dtype=np.int64), matrix
+
+
+def _recipe_item_neighbours(matrix):
+    # Sutunlari normalize edilmis matrisle tarif x tarif kosinus benzerligi
+    # RECOMMENDATION_BLOCK_ROWS'luk tarif bloklari halinde hesaplanir; her
+    # tarifin en yakin RECOMMENDATION_ITEM_NEIGHBOURS komsusu seyrek bir
+    # tarif x tarif matrisinde doner.
+    import numpy as np
+    from scipy import sparse
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1.0
+    normalized = (matrix @ sparse.diags(1.0 / norms)).tocsr()
+    by_item = normalized.T.tocsr()
+    item_count = matrix.shape[1]
+    rows, cols, data = [], [], []
+    for start in range(0, item_count, RECOMMENDATION_BLOCK_ROWS):
+        similarities = (by_item[start : start + RECOMMENDATION_BLOCK_ROWS] @ normalized).tocsr()
+        for row, (neighbour_cols, values) in enumerate(
+            _sparse_top_k(similarities, RECOMMENDATION_ITEM_NEIGHBOURS, offset=start)
+        ):
+            rows.extend([start + row] * len(neighbour_cols))
+            cols.extend(neighbour_cols.tolist())
+            data.extend(values.tolist())
+    return sparse.csr_matrix((data, (rows, cols)), shape=(item_count, item_count))
+
+
+def rebuild_recipe_recommendations(db: Session) -> int:
+    import numpy as np
+    from scipy import sparse
+
+    interactions = _load_recipe_interactions(db)
+    stored_users = {
+        row[0] for row in db.query(RecipeUserCandidateDB.user_email).distinct().all()
+    }
+    if interactions:
+        users, recipe_ids, matrix = _recipe_interaction_matrix(interactions)
+        neighbours = _recipe_item_neighbours(matrix)
+        # Silinmis tarifler aday olamaz: sutunlari sifirlanir
+        existing = {row[0] for row in db.query(RecipeDB.id).all()}
+        alive = np.fromiter(
+            (recipe_id in existing for recipe_id in recipe_ids), dtype=np.float64
+        )
+        neighbours = (neighbours @ sparse.diags(alive)).tocsr()
+    else:
+        users = []
+    db.commit()
+
+    count = 0
+
+    def candidates():
+        nonlocal count
+        for start in range(0, len(users), RECOMMENDATION_BLOCK_ROWS):
+            block = matrix[start : start + RECOMMENDATION_BLOCK_ROWS]
+            # skor = sum(etkilesim agirligi * benzerlik); kullanicinin zaten
+            # etkilesimde oldugu tarifler maskelenir
+            seen = block.copy()
+            seen.data[:] = 1.0
+            scores = (block @ neighbours).tocsr()
+            scores = (scores - scores.multiply(seen)).tocsr()
+            scores.eliminate_zeros()
+            for row, (cols, values) in enumerate(
+                _sparse_top_k(scores, RECOMMENDATION_CANDIDATES)
+            ):
+                user_email = users[start + row]
+                if len(cols):
+                    count += 1
+                elif user_email not in stored_users:
+                    continue
+                yield user_email, [
+                    {"user_email": user_email, "recipe_id": recipe_id, "score": score}
+                    for recipe_id, score in zip(recipe_ids[cols].tolist(), values.tolist())
+                ]
+        # Artik etkilesimi kalmayan kullanicilarin eski adaylari silinir
+        for user_email in stored_users.difference(users):
+            yield user_email, []
+
+    _replace_rows_in_batches(db, RecipeUserCandidateDB.__table__.c.user_email, candidates())
+    return count
+
+
 # 14) Tarif Ekle
 @app.post("/recipes", response_model=RecipeOut)
+@_db_endpoint
 def create_recipe(payload: RecipeCreate, db: Session = Depends(get_db)):
     title = payload.title.strip()
     if not title:
@@ -1485,19 +5214,26 @@ def create_recipe(payload: RecipeCreate, db: Session = Depends(get_db)):
         comments=0,
     )
     db.add(recipe)
+    db.flush()
+    _index_recipe_for_search(db, recipe)
+    _index_recipe_ingredients(db, recipe)
+    _queue_similarity_refresh(db, [recipe.id])
     db.commit()
     db.refresh(recipe)
+    recipe_hot_scores.add(recipe.id, RECIPE_TRENDING_WEIGHTS["create"])
     comment_counts = {recipe.id: recipe.comments or 0}
     save_counts = _get_recipe_save_counts(db, [recipe.id])
     return _recipe_to_out(
         recipe,
         comment_counts=comment_counts,
         save_counts=save_counts,
+        like_counts=recipe_like_counter.current(db, [recipe.id]),
     )
 
 
 # 14b) Tarif Guncelle
 @app.put("/recipes/{recipe_id}", response_model=RecipeOut)
+@_db_endpoint
 def update_recipe(recipe_id: int, payload: RecipeUpdate, db: Session = Depends(get_db)):
     recipe = db.query(RecipeDB).filter(RecipeDB.id == recipe_id).first()
     if not recipe:
@@ -1520,6 +5256,7 @@ def update_recipe(recipe_id: int, payload: RecipeUpdate, db: Session = Depends(g
         recipe.story = payload.story
     if payload.ingredients is not None:
         recipe.ingredients_json = json.dumps(payload.ingredients or [])
+        _index_recipe_ingredients(db, recipe)
     if payload.steps is not None:
         recipe.steps_json = json.dumps(payload.steps or [])
     if payload.category is not None:
@@ -1539,6 +5276,15 @@ def update_recipe(recipe_id: int, payload: RecipeUpdate, db: Session = Depends(g
     if payload.gallery_images is not None:
         recipe.gallery_json = json.dumps(payload.gallery_images or [])
 
+    _index_recipe_for_search(db, recipe)
+    if (
+        payload.title is not None
+        or payload.category is not None
+        or payload.ingredients is not None
+    ):
+        _queue_similarity_refresh(
+            db, [recipe.id, *_recipes_listing_as_similar(db, recipe.id)]
+        )
     db.commit()
     db.refresh(recipe)
     comment_counts = _get_recipe_comment_counts(db, [recipe.id])
@@ -1547,11 +5293,13 @@ def update_recipe(recipe_id: int, payload: RecipeUpdate, db: Session = Depends(g
         recipe,
         comment_counts=comment_counts,
         save_counts=save_counts,
+        like_counts=recipe_like_counter.current(db, [recipe.id]),
     )
 
 
 # 14c) Tarif Sil
 @app.delete("/recipes/{recipe_id}")
+@_db_endpoint
 def delete_recipe(recipe_id: int, user_email: Optional[str] = None, db: Session = Depends(get_db)):
     recipe = db.query(RecipeDB).filter(RecipeDB.id == recipe_id).first()
     if not recipe:
@@ -1567,9 +5315,33 @@ def delete_recipe(recipe_id: int, user_email: Optional[str] = None, db: Session
         RecipeCommentDB.recipe_id == recipe_id
     ).delete()
     db.query(RecipeLikeDB).filter(RecipeLikeDB.recipe_id == recipe_id).delete()
+    recipe_like_counter.discard(recipe_id)
+    recipe_hot_scores.discard(recipe_id)
+    # Bu tarifi komsu olarak tutan tarifler bir sonraki yenilemede yeniden hesaplanir
+    referencing = _recipes_listing_as_similar(db, recipe_id)
+    db.query(RecipeSimilarDB).filter(
+        or_(
+            RecipeSimilarDB.recipe_id == recipe_id,
+            RecipeSimilarDB.similar_recipe_id == recipe_id,
+        )
+    ).delete(synchronize_session=False)
+    db.query(RecipeSimilarityQueueDB).filter(
+        RecipeSimilarityQueueDB.recipe_id == recipe_id
+    ).delete(synchronize_session=False)
+    db.query(RecipeSimilarityVectorDB).filter(
+        RecipeSimilarityVectorDB.recipe_id == recipe_id
+    ).delete(synchronize_session=False)
+    _queue_similarity_refresh(db, referencing)
+    db.query(RecipeUserCandidateDB).filter(
+        RecipeUserCandidateDB.recipe_id == recipe_id
+    ).delete(synchronize_session=False)
     db.query(RecipeNotebookItemDB).filter(
         RecipeNotebookItemDB.recipe_id == recipe_id
     ).delete()
+    db.query(RecipeIngredientDB).filter(
+        RecipeIngredientDB.recipe_id == recipe_id
+    ).delete()
+    _remove_recipe_from_search(db, recipe_id)
     db.delete(recipe)
     db.commit()
     return {"message": "Recipe deleted"}
@@ -1577,6 +5349,7 @@ def delete_recipe(recipe_id: int, user_email: Optional[str] = None, db: Session
 
 # 14d) Tarif Begen
 @app.post("/recipes/{recipe_id}/like")
+@_db_endpoint
 def toggle_recipe_like(
     recipe_id: int,
     payload: RecipeLikeToggle,
@@ -1586,69 +5359,261 @@ def toggle_recipe_like(
     if not user_email:
         raise HTTPException(status_code=400, detail="User email is required")
 
-    recipe = db.query(RecipeDB).filter(RecipeDB.id == recipe_id).first()
-    if not recipe:
+    exists = db.query(RecipeDB.id).filter(RecipeDB.id == recipe_id).first()
+    if exists is None:
         raise HTTPException(status_code=404, detail="Recipe not found")
 
-    existing = (
-        db.query(RecipeLikeDB)
-        .filter(
-            RecipeLikeDB.recipe_id == recipe_id,
-            func.lower(RecipeLikeDB.user_email) == user_email,
-        )
-        .first()
+    # Begeni satiri benzersiz indeksle korunur; recipes.likes sayaci ise
+    # recipe_like_counter uzerinden toplu olarak guncellenir
+    criteria = (
+        RecipeLikeDB.recipe_id == recipe_id,
+        RecipeLikeDB.user_email == user_email,
     )
-
-    if existing:
-        db.delete(existing)
-        recipe.likes = max((recipe.likes or 0) - 1, 0)
-        liked = False
+    liked_at = db.query(RecipeLikeDB.created_at).filter(*criteria).first()
+    removed = (
+        db.query(RecipeLikeDB).filter(*criteria).delete(synchronize_session=False)
+        if liked_at
+        else 0
+    )
+    if removed:
+        liked, delta = False, -1
     else:
         db.add(RecipeLikeDB(recipe_id=recipe_id, user_email=user_email))
-        recipe.likes = (recipe.likes or 0) + 1
-        liked = True
-
-    db.commit()
-    return {"liked": liked, "likes": recipe.likes or 0}
+        liked, delta = True, 1
+    try:
+        db.commit()
+    except IntegrityError:
+        # Ayni kullanicinin es zamanli ikinci dokunusu: begeni zaten yazildi
+        db.rollback()
+        liked, delta = True, 0
+
+    if delta:
+        recipe_like_counter.add(recipe_id, delta)
+    if delta > 0:
+        recipe_hot_scores.add(recipe_id, RECIPE_TRENDING_WEIGHTS["like"])
+    elif delta < 0 and liked_at[0] is not None:
+        # Begeninin kendi anindaki katkisi dusulur
+        recipe_hot_scores.add(recipe_id, -RECIPE_TRENDING_WEIGHTS["like"], liked_at[0])
+    likes = recipe_like_counter.current(db, [recipe_id])[recipe_id]
+    return {"liked": liked, "likes": likes}
 
 
 # 15) Tarif Listele
-@app.get("/recipes", response_model=List[RecipeOut])
+@app.get("/recipes", response_model=List[Union[RecipeOut, RecipeSummaryOut]])
+@_db_endpoint
 def list_recipes(
+    response: Response,
     author_email: Optional[str] = None,
     viewer_email: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    view: str = "full",
+    sort: str = "recent",
     db: Session = Depends(get_db),
 ):
-    query = db.query(RecipeDB).order_by(RecipeDB.created_at.desc())
+    if view not in ("full", "summary"):
+        raise HTTPException(status_code=400, detail="Invalid view (full/summary)")
+    if sort not in ("recent", "trending", "for_you"):
+        raise HTTPException(
+            status_code=400, detail="Invalid sort (recent/trending/for_you)"
+        )
+    score_column = None
+    if sort == "for_you":
+        viewer = (viewer_email or "").strip().lower()
+        if not viewer:
+            raise HTTPException(status_code=400, detail="Viewer email is required")
+        has_candidates = (
+            db.query(RecipeUserCandidateDB.recipe_id)
+            .filter(RecipeUserCandidateDB.user_email == viewer)
+            .first()
+        )
+        if has_candidates is not None:
+            score_column = RecipeUserCandidateDB.score
+            query = db.query(RecipeDB, score_column).join(
+                RecipeUserCandidateDB,
+                and_(
+                    RecipeUserCandidateDB.recipe_id == RecipeDB.id,
+                    RecipeUserCandidateDB.user_email == viewer,
+                ),
+            )
+        else:
+            sort = "trending"  # henuz aday listesi olmayan kullanici
+    if sort == "trending":
+        score_column = RecipeDB.hot_score
+        query = db.query(RecipeDB, score_column)
+    if score_column is not None:
+        query = query.order_by(score_column.desc(), RecipeDB.id.desc())
+    else:
+        query = db.query(RecipeDB).order_by(RecipeDB.created_at.desc(), RecipeDB.id.desc())
+    if view == "summary":
+        query = query.options(load_only(*_RECIPE_SUMMARY_COLUMNS))
     if author_email:
         normalized = author_email.strip().lower()
-        query = query.filter(func.lower(RecipeDB.author_email) == normalized)
-    recipes = query.all()
-    liked_ids = None
-    if viewer_email:
-        normalized_viewer = viewer_email.strip().lower()
-        liked_rows = (
-            db.query(RecipeLikeDB.recipe_id)
-            .filter(func.lower(RecipeLikeDB.user_email) == normalized_viewer)
+        query = query.filter(RecipeDB.author_email == normalized)
+    if score_column is None:
+        recipes = _fetch_created_page(query, RecipeDB, response, limit, cursor)
+        return _recipes_to_out(db, recipes, viewer_email, summary=view == "summary")
+
+    limit = max(1, min(limit, 100))
+    if cursor:
+        cursor_score, cursor_id = _decode_score_cursor(cursor)
+        query = query.filter(
+            or_(
+                score_column < cursor_score,
+                and_(score_column == cursor_score, RecipeDB.id < cursor_id),
+            )
+        )
+    rows = query.limit(limit + 1).all()
+    recipes = [row[0] for row in rows]
+    scores = [row[1] or 0.0 for row in rows]
+    if len(recipes) > limit:
+        recipes = recipes[:limit]
+        response.headers["X-Next-Cursor"] = _encode_score_cursor(
+            scores[limit - 1], recipes[-1].id
+        )
+    return _recipes_to_out(db, recipes, viewer_email, summary=view == "summary")
+
+
+# 15b) Tarif Arama
+@app.get("/recipes/search", response_model=List[RecipeOut])
+@_db_endpoint
+def search_recipes(
+    q: str,
+    viewer_email: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+    db: Session = Depends(get_db),
+):
+    limit = max(1, min(limit, 100))
+    offset = max(0, offset)
+    terms = [term for term in re.split(r"\W+", _fold_search_text(q)) if term]
+    if not terms:
+        raise HTTPException(status_code=400, detail="Search query is required")
+
+    if RECIPE_FTS_ENABLED:
+        # Her kelime onek olarak aranir (AND); baslik en agir sekilde puanlanir
+        match = " ".join(f'"{term}"*' for term in terms)
+        rows = db.execute(
+            text(
+                "SELECT rowid FROM recipes_fts WHERE recipes_fts MATCH :match "
+                "ORDER BY bm25(recipes_fts, 10.0, 4.0, 1.0, 3.0, 5.0, 1.0) "
+                "LIMIT :limit OFFSET :offset"
+            ),
+            {"match": match, "limit": limit, "offset": offset},
+        ).fetchall()
+        ids = [row[0] for row in rows]
+        by_id = {}
+        if ids:
+            by_id = {
+                recipe.id: recipe
+                for recipe in db.query(RecipeDB).filter(RecipeDB.id.in_(ids)).all()
+            }
+        recipes = [by_id[recipe_id] for recipe_id in ids if recipe_id in by_id]
+    else:
+        query = db.query(RecipeDB)
+        for term in terms:
+            query = query.filter(RecipeDB.search_text.like(f"%{term}%"))
+        recipes = (
+            query.order_by(RecipeDB.created_at.desc(), RecipeDB.id.desc())
+            .offset(offset)
+            .limit(limit)
             .all()
         )
-        liked_ids = {row[0] for row in liked_rows}
-    recipe_ids = [recipe.id for recipe in recipes]
-    comment_counts = _get_recipe_comment_counts(db, recipe_ids)
-    save_counts = _get_recipe_save_counts(db, recipe_ids)
-    return [
-        _recipe_to_out(
-            recipe,
-            liked_ids,
-            comment_counts=comment_counts,
-            save_counts=save_counts,
+    return _recipes_to_out(db, recipes, viewer_email)
+
+
+# 15c) Eldeki Malzemelerle Tarif
+@app.post("/recipes/pantry", response_model=List[PantryRecipeOut])
+@_db_endpoint
+def search_recipes_by_pantry(payload: PantrySearch, db: Session = Depends(get_db)):
+    if payload.sort not in ("missing", "coverage"):
+        raise HTTPException(status_code=400, detail="Invalid sort")
+    limit = max(1, min(payload.limit, 100))
+    offset = max(0, payload.offset)
+    pantry = {
+        key for key in (_normalize_ingredient(item) for item in payload.ingredients) if key
+    }
+    if not pantry:
+        raise HTTPException(status_code=400, detail="Ingredients are required")
+
+    # Yalnizca pantry malzemelerinin posting listeleri okunur; tarif tablosu
+    # taranmaz, her aday tarif icin eslesen malzeme sayisi gruplanarak bulunur.
+    matched = func.count(RecipeIngredientDB.recipe_id)
+    missing = RecipeDB.ingredient_count - matched
+    query = (
+        db.query(RecipeIngredientDB.recipe_id, matched, missing)
+        .join(RecipeDB, RecipeDB.id == RecipeIngredientDB.recipe_id)
+        .filter(RecipeIngredientDB.ingredient_key.in_(sorted(pantry)))
+        .group_by(RecipeIngredientDB.recipe_id, RecipeDB.ingredient_count)
+    )
+    if payload.max_missing is not None:
+        query = query.having(missing <= max(0, payload.max_missing))
+    if payload.sort == "coverage":
+        coverage = matched * 1.0 / RecipeDB.ingredient_count
+        query = query.order_by(coverage.desc(), missing.asc())
+    else:
+        query = query.order_by(missing.asc(), matched.desc())
+    rows = (
+        query.order_by(RecipeIngredientDB.recipe_id.desc())
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
+    if not rows:
+        return []
+
+    ids = [row[0] for row in rows]
+    by_id = {
+        recipe.id: recipe
+        for recipe in db.query(RecipeDB).filter(RecipeDB.id.in_(ids)).all()
+    }
+    recipes = [by_id[recipe_id] for recipe_id in ids if recipe_id in by_id]
+    counts = {row[0]: (row[1], row[2]) for row in rows}
+    results = []
+    for out in _recipes_to_out(db, recipes, payload.viewer_email):
+        matched_count, missing_count = counts[out.id]
+        results.append(
+            PantryRecipeOut(
+                **out.model_dump(),
+                matched_count=matched_count,
+                missing_count=missing_count,
+                missing_ingredients=[
+                    item
+                    for item in out.ingredients
+                    if _normalize_ingredient(item) not in pantry | {None}
+                ],
+            )
         )
-        for recipe in recipes
-    ]
+    return results
+
+
+# 15d) Benzer Tarifler
+@app.get("/recipes/{recipe_id}/similar", response_model=List[RecipeSummaryOut])
+@_db_endpoint
+def get_similar_recipes(
+    recipe_id: int,
+    viewer_email: Optional[str] = None,
+    limit: int = 10,
+    db: Session = Depends(get_db),
+):
+    limit = max(1, min(limit, RECIPE_SIMILAR_TOP_K))
+    if db.query(RecipeDB.id).filter(RecipeDB.id == recipe_id).first() is None:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    recipes = (
+        db.query(RecipeDB)
+        .options(load_only(*_RECIPE_SUMMARY_COLUMNS))
+        .join(RecipeSimilarDB, RecipeSimilarDB.similar_recipe_id == RecipeDB.id)
+        .filter(RecipeSimilarDB.recipe_id == recipe_id)
+        .order_by(RecipeSimilarDB.score.desc(), RecipeDB.id.asc())
+        .limit(limit)
+        .all()
+    )
+    return _recipes_to_out(db, recipes, viewer_email, summary=True)
 
 
 # 16) Tarif Detay
 @app.get("/recipes/{recipe_id}", response_model=RecipeOut)
+@_db_endpoint
 def get_recipe(recipe_id: int, db: Session = Depends(get_db)):
     recipe = db.query(RecipeDB).filter(RecipeDB.id == recipe_id).first()
     if not recipe:
@@ -1659,11 +5624,13 @@ def get_recipe(recipe_id: int, db: Session = Depends(get_db)):
         recipe,
         comment_counts=comment_counts,
         save_counts=save_counts,
+        like_counts=recipe_like_counter.current(db, [recipe.id]),
     )
 
 
 # 16b) Tarif Yorumlar
 @app.get("/recipes/{recipe_id}/comments", response_model=List[RecipeCommentOut])
+@_db_endpoint
 def list_recipe_comments(
     recipe_id: int,
     limit: int = 200,
@@ -1684,6 +5651,7 @@ def list_recipe_comments(
 
 
 @app.post("/recipes/{recipe_id}/comments", response_model=RecipeCommentOut)
+@_db_endpoint
 def create_recipe_comment(
     recipe_id: int, payload: RecipeCommentCreate, db: Session = Depends(get_db)
 ):
@@ -1707,11 +5675,13 @@ def create_recipe_comment(
     recipe.comments = (recipe.comments or 0) + 1
     db.commit()
     db.refresh(new_comment)
+    recipe_hot_scores.add(recipe_id, RECIPE_TRENDING_WEIGHTS["comment"])
     return new_comment
 
 
 # 17) Defter Olustur
 @app.post("/recipe-notebooks", response_model=RecipeNotebookOut)
+@_db_endpoint
 def create_recipe_notebook(
     payload: RecipeNotebookCreate, db: Session = Depends(get_db)
 ):
@@ -1719,11 +5689,12 @@ def create_recipe_notebook(
     if not title:
         raise HTTPException(status_code=400, detail="Notebook title is required")
 
+    owner_email = (payload.owner_email or "").strip().lower() or None
     notebook = RecipeNotebookDB(
         title=title,
         cover_image_url=payload.cover_image_url,
         owner_name=payload.owner_name,
-        owner_email=payload.owner_email,
+        owner_email=owner_email,
     )
     db.add(notebook)
     db.commit()
@@ -1733,6 +5704,7 @@ def create_recipe_notebook(
 
 # 18) Defter Listele
 @app.get("/recipe-notebooks", response_model=List[RecipeNotebookOut])
+@_db_endpoint
 def list_recipe_notebooks(
     owner_email: Optional[str] = None,
     db: Session = Depends(get_db),
@@ -1740,13 +5712,14 @@ def list_recipe_notebooks(
     query = db.query(RecipeNotebookDB).order_by(RecipeNotebookDB.created_at.desc())
     if owner_email:
         normalized = owner_email.strip().lower()
-        query = query.filter(func.lower(RecipeNotebookDB.owner_email) == normalized)
+        query = query.filter(RecipeNotebookDB.owner_email == normalized)
     notebooks = query.all()
     return [_notebook_to_out(notebook) for notebook in notebooks]
 
 
 # 19) Defter Guncelle
 @app.put("/recipe-notebooks/{notebook_id}", response_model=RecipeNotebookOut)
+@_db_endpoint
 def update_recipe_notebook(
     notebook_id: int, payload: RecipeNotebookUpdate, db: Session = Depends(get_db)
 ):
@@ -1771,6 +5744,7 @@ def update_recipe_notebook(
 
 # 20) Defter Sil
 @app.delete("/recipe-notebooks/{notebook_id}")
+@_db_endpoint
 def delete_recipe_notebook(notebook_id: int, db: Session = Depends(get_db)):
     notebook = (
         db.query(RecipeNotebookDB).filter(RecipeNotebookDB.id == notebook_id).first()
@@ -1787,6 +5761,7 @@ def delete_recipe_notebook(notebook_id: int, db: Session = Depends(get_db)):
     "/recipe-notebooks/{notebook_id}/items",
     response_model=RecipeNotebookOut,
 )
+@_db_endpoint
 def add_recipe_to_notebook(
     notebook_id: int,
     payload: RecipeNotebookItemCreate,
@@ -1821,6 +5796,7 @@ def add_recipe_to_notebook(
     )
     db.commit()
     db.refresh(notebook)
+    recipe_hot_scores.add(payload.recipe_id, RECIPE_TRENDING_WEIGHTS["save"])
     return _notebook_to_out(notebook)
 
 
@@ -1829,6 +5805,7 @@ def add_recipe_to_notebook(
     "/recipe-notebooks/{notebook_id}/items/{recipe_id}",
     response_model=RecipeNotebookOut,
 )
+@_db_endpoint
 def remove_recipe_from_notebook(
     notebook_id: int,
     recipe_id: int,
@@ -1849,8 +5826,109 @@ def remove_recipe_from_notebook(
         .first()
     )
     if item:
+        saved_at = item.created_at
         db.delete(item)
         db.commit()
         db.refresh(notebook)
+        if saved_at is not None:
+            recipe_hot_scores.add(recipe_id, -RECIPE_TRENDING_WEIGHTS["save"], saved_at)
 
     return _notebook_to_out(notebook)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Eaty API bakim komutlari")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser(
+        "rebuild-rating-stats",
+        help="business_rating_stats tablosunu yorumlardan yeniden hesaplar",
+    )
+    subparsers.add_parser(
+        "rebuild-geo-index",
+        help="business_geo_cells tablosunu isletme konumlarindan yeniden kurar",
+    )
+    subparsers.add_parser(
+        "rebuild-recipe-search",
+        help="recipes_fts arama indeksini tariflerden yeniden kurar",
+    )
+    subparsers.add_parser(
+        "rebuild-ingredient-index",
+        help="recipe_ingredients ters indeksini tariflerden yeniden kurar",
+    )
+    subparsers.add_parser(
+        "rebuild-trending-scores",
+        help="hot_score degerlerini begeni/yorum/kaydetme kayitlarindan yeniden hesaplar",
+    )
+    subparsers.add_parser(
+        "renormalize-trending",
+        help="trend epoch'unu simdiye alir ve hot_score degerlerini olcekler",
+    )
+    subparsers.add_parser(
+        "rebuild-similar-recipes",
+        help="recipe_similar tablosunu tum tariflerden yeniden hesaplar",
+    )
+    subparsers.add_parser(
+        "refresh-similar-recipes",
+        help="yalnizca yeni/guncellenmis tariflerin benzerlerini yeniler (cron)",
+    )
+    subparsers.add_parser(
+        "rebuild-recommendations",
+        help="kullanici basina oneri adaylarini begeni/defter kayitlarindan hesaplar (cron)",
+    )
+    subparsers.add_parser(
+        "reconcile-recipe-likes",
+        help="recipes.likes sayaclarini recipe_likes satirlarindan yeniden sayar "
+        "(cokme sonrasi; begeni trafiginin dustugu saatte cron)",
+    )
+    subparsers.add_parser(
+        "rebuild-business-analytics",
+        help="saatlik/gunluk isletme ozetlerini siparis ve yorumlardan yeniden kurar",
+    )
+    subparsers.add_parser(
+        "rebuild-product-search",
+        help="products_fts arama indeksini urunlerden yeniden kurar",
+    )
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild-rating-stats":
+            count = rebuild_business_rating_stats(db)
+            print(f"Rebuilt rating stats for {count} businesses")
+        elif args.command == "rebuild-geo-index":
+            count = rebuild_business_geo_cells(db)
+            print(f"Indexed delivery areas of {count} businesses")
+        elif args.command == "rebuild-recipe-search":
+            count = rebuild_recipe_search_index(db)
+            print(f"Indexed {count} recipes for search")
+        elif args.command == "rebuild-ingredient-index":
+            count = rebuild_recipe_ingredient_index(db)
+            print(f"Indexed ingredients of {count} recipes")
+        elif args.command == "rebuild-trending-scores":
+            count = rebuild_trending_scores(db)
+            print(f"Rebuilt trending scores for {count} recipes")
+        elif args.command == "renormalize-trending":
+            renormalize_trending_scores(db, force=True)
+            print("Renormalized trending scores")
+        elif args.command == "rebuild-similar-recipes":
+            count = rebuild_similar_recipes(db)
+            print(f"Computed similar recipes for {count} recipes")
+        elif args.command == "refresh-similar-recipes":
+            count = refresh_similar_recipes(db)
+            print(f"Refreshed similar recipes for {count} queued recipes")
+        elif args.command == "rebuild-recommendations":
+            count = rebuild_recipe_recommendations(db)
+            print(f"Stored recommendations for {count} users")
+        elif args.command == "reconcile-recipe-likes":
+            count = reconcile_recipe_likes(db)
+            print(f"Corrected like counters of {count} recipes")
+        elif args.command == "rebuild-business-analytics":
+            count = rebuild_business_analytics(db)
+            print(f"Rolled up {count} orders")
+        elif args.command == "rebuild-product-search":
+            count = rebuild_product_search_index(db)
+            print(f"Indexed {count} products for search")
+    finally:
+        db.close()
@@ -81,6 +81,7 @@ class _CheckoutPageState extends State<CheckoutPage> {
     final items = cart.items
         .map(
           (item) => {
+            'product_id': item.id,
             'product_name': item.name,
             'quantity': item.quantity,
             'price': item.price,
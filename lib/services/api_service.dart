@@ -139,15 +139,32 @@ class ApiService {
     }
   }
 
+  // Sayfalı listeler: her istek en fazla `limit` kayıt döner, devamı
+  // X-Next-Cursor başlığındaki imleçle istenir.
+  Future<List<dynamic>> _getAllPages(Uri uri, {int limit = 50}) async {
+    final items = <dynamic>[];
+    String? cursor;
+    do {
+      final response = await http.get(
+        uri.replace(
+          queryParameters: {
+            ...uri.queryParameters,
+            'limit': '$limit',
+            if (cursor != null) 'cursor': cursor,
+          },
+        ),
+      );
+      if (response.statusCode != 200) break;
+      items.addAll(List<dynamic>.from(jsonDecode(response.body)));
+      cursor = response.headers['x-next-cursor'];
+    } while (cursor != null && cursor.isNotEmpty);
+    return items;
+  }
+
   //  İşletme Siparişleri
   Future<List<dynamic>> getBusinessOrders(String email) async {
     try {
-      final response = await http.get(
-        Uri.parse('$baseUrl/business/$email/orders'),
-      );
-      if (response.statusCode == 200) {
-        return List<dynamic>.from(jsonDecode(response.body));
-      }
+      return await _getAllPages(Uri.parse('$baseUrl/business/$email/orders'));
     } catch (e) {
       print("Get Orders Error: $e");
     }
@@ -157,12 +174,7 @@ class ApiService {
   //  Müşteri Siparişleri
   Future<List<dynamic>> getCustomerOrders(String email) async {
     try {
-      final response = await http.get(
-        Uri.parse('$baseUrl/orders/customer/$email'),
-      );
-      if (response.statusCode == 200) {
-        return List<dynamic>.from(jsonDecode(response.body));
-      }
+      return await _getAllPages(Uri.parse('$baseUrl/orders/customer/$email'));
     } catch (e) {
       print("Get Customer Orders Error: $e");
     }
@@ -518,10 +530,7 @@ class ApiService {
       final uri = params.isEmpty
           ? Uri.parse('$baseUrl/recipes')
           : Uri.parse('$baseUrl/recipes?${params.join('&')}');
-      final response = await http.get(uri);
-      if (response.statusCode == 200) {
-        return List<dynamic>.from(jsonDecode(response.body));
-      }
+      return await _getAllPages(uri);
     } catch (e) {
       print("Get Recipes Error: $e");
     }